@@ -150,6 +150,42 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Media is served by pages.media.serve_media (ETag/304, byte ranges). Set
+# MEDIA_SENDFILE to 'x-sendfile' (Apache) or 'x-accel-redirect' (nginx, with an
+# internal location at MEDIA_SENDFILE_PREFIX aliased to MEDIA_ROOT) to let the
+# web server send the file bodies.
+MEDIA_SENDFILE = config("MEDIA_SENDFILE", default="")
+MEDIA_SENDFILE_PREFIX = config("MEDIA_SENDFILE_PREFIX", default="/protected-media/")
+# Browser cache lifetime of media whose name doesn't change with its content
+MEDIA_CACHE_MAX_AGE = config("MEDIA_CACHE_MAX_AGE", default=3600, cast=int)
+
+
+# Host (e.g. "fund.example.com") of the links in emails sent outside a request,
+# such as `manage.py notify_milestones`. Those commands refuse to run without it.
+SITE_DOMAIN = config("SITE_DOMAIN", default="")
+
+
+# Project status transitions (coming_soon -> active -> completed) run from
+# `manage.py transition_project_statuses` (cron or --loop). Set this to run
+# them from a background thread inside each web process instead.
+PROJECT_STATUS_TICKER = config("PROJECT_STATUS_TICKER", default=False, cast=bool)
+
+
+# Sessions only carry the admin/user ids and backend markers (see
+# pages/session_utils.py), so they are read from the cache and written through
+# to the database instead of hitting SQLite on every request. Use
+# 'django.contrib.sessions.backends.signed_cookies' to keep them client-side;
+# `manage.py purge_sessions` deletes expired database rows in batches.
+SESSION_ENGINE = config(
+    "SESSION_ENGINE", default="django.contrib.sessions.backends.cached_db"
+)
+
+
+# Issue activation/password reset links as signed, timestamped tokens (bound
+# to the account state, so usable once) instead of ActivationToken and
+# PasswordResetToken rows: no token table writes on signup or reset.
+SIGNED_ACCOUNT_TOKENS = config("SIGNED_ACCOUNT_TOKENS", default=False, cast=bool)
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -173,10 +209,10 @@ LOGOUT_REDIRECT_URL = '/'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 
+# One backend for both logins: a single user lookup and password check. Admin
+# and user logins are told apart by the login forms (confirm_login_allowed)
 AUTHENTICATION_BACKENDS = [
-    'pages.authentication_backends.AdminAuthenticationBackend',
-    'pages.authentication_backends.UserAuthenticationBackend',
-    'django.contrib.auth.backends.ModelBackend',  # Fallback
+    'pages.authentication_backends.EmailAuthenticationBackend',
 ]
 
 
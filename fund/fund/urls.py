@@ -15,15 +15,15 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.conf import settings  # type: ignore
-from django.conf.urls.static import static # type: ignore
 from django.contrib import admin # type: ignore
-from django.urls import path,include # type: ignore
+from django.urls import path,include,re_path # type: ignore
+
+from pages.media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',include('pages.urls')),
 
+    # Uploaded media, in production too (see pages/media.py)
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>.+)$', serve_media, name='media'),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
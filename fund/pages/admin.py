@@ -3,7 +3,7 @@ from django.contrib.auth.admin import UserAdmin
 from .models import (
     CustomUser, ActivationToken, Tag, 
     Project, ProjectPicture, Donation, Comment,
-    Rating, ReportedProject, ReportedComment, PasswordResetToken
+    Rating, ReportedProject, ReportedComment, PasswordResetToken, OutboundEmail
 )
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 from django.db.models import Sum
@@ -72,6 +72,14 @@ class PasswordResetTokenAdmin(admin.ModelAdmin):
     is_expired.short_description = 'Expired'
 
 
+# Outbound Email Admin
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('to', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+
+
 # Tag Admin
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'project_count')
@@ -161,13 +169,13 @@ class DonationAdmin(admin.ModelAdmin):
 
 # Comment Admin
 class CommentAdmin(admin.ModelAdmin):
-    list_display = ('user', 'project', 'short_content', 'created_at', 'is_reported', 'is_reply')
+    list_display = ('user', 'project', 'short_content', 'created_at', 'is_reported', 'is_reply', 'reply_count')
     list_filter = ('created_at', 'is_reported', 'project')
     search_fields = (
         'user__email', 'user__first_name', 'user__last_name',
         'project__title', 'content'
     )
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'reply_count', 'path')
     
     def short_content(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
@@ -224,6 +232,7 @@ class ReportedCommentAdmin(admin.ModelAdmin):
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(ActivationToken, ActivationTokenAdmin)
 admin.site.register(PasswordResetToken, PasswordResetTokenAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Project, ProjectAdmin)
 admin.site.register(ProjectPicture)
@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class PagesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pages'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401
+
+        if getattr(settings, 'PROJECT_STATUS_TICKER', False):
+            from .transitions import start_ticker
+            start_ticker()
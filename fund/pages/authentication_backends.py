@@ -3,41 +3,31 @@ from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
-
-class AdminAuthenticationBackend(ModelBackend):
+class EmailAuthenticationBackend(ModelBackend):
     """
-    Authenticate admin users (staff or superuser).
+    Authenticate admin users (staff or superuser) and regular users alike by
+    email, looking the user up once and checking the password hash once.
+
+    Which kind of account may use which login page is decided by the forms'
+    confirm_login_allowed(), so they can say why a login was refused. Inactive
+    accounts are returned too, so the login forms can tell the user to
+    activate them.
     """
 
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(email=username)
-            if user.check_password(password) and (user.is_staff or user.is_superuser):
-                return user
-        except User.DoesNotExist:
+        if username is None or password is None:
             return None
-        return None
-
-    def get_user(self, user_id):
         try:
-            return User.objects.get(pk=user_id)
+            user = User.objects.get(email=username)
         except User.DoesNotExist:
+            # Run the hasher anyway so unknown emails take as long as wrong
+            # passwords
+            User().set_password(password)
             return None
 
-
-class UserAuthenticationBackend(ModelBackend):
-    """
-    Authenticate regular (non-staff, non-superuser) users.
-    """
-
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(email=username)
-            if user.check_password(password) and not user.is_staff and not user.is_superuser:
-                return user
-        except User.DoesNotExist:
+        if not user.check_password(password):
             return None
-        return None
+        return user
 
     def get_user(self, user_id):
         try:
@@ -0,0 +1,156 @@
+"""
+In-process prefix trie for tag autocomplete.
+
+Tags are matched case-insensitively on their name and weighted by how many
+projects use them; suggestions carry the tag id and the name as stored. Each
+trie node keeps its best few tags so a lookup is a walk down the prefix, independent of how
+many tags share it. The trie is built lazily on the first lookup, updated
+incrementally by the receivers in signals.py and fully rebuilt after
+TAG_TRIE_MAX_AGE seconds to pick up changes made by other processes.
+"""
+import threading
+import time
+
+from django.db.models import Count
+
+from .models import Tag
+
+# Names kept per node, i.e. the most suggestions a lookup can return
+TOP_PER_NODE = 10
+
+TAG_TRIE_MAX_AGE = 600
+
+
+class _Node:
+    __slots__ = ('children', 'top', 'terminals')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []
+        self.terminals = set()  # ids of the tags whose name ends exactly here
+
+
+class TagTrie:
+    """
+    Prefix trie of tag names (matched case-insensitively), each node holding
+    the ids of its TOP_PER_NODE heaviest tags
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.weights = {}
+        self.names = {}
+
+    def _path(self, name):
+        node = self.root
+        yield node
+        for char in name.lower():
+            node = node.children.setdefault(char, _Node())
+            yield node
+
+    def _rank(self, tag_ids):
+        return sorted(
+            tag_ids, key=lambda tag_id: (-self.weights[tag_id], self.names[tag_id].lower(), tag_id)
+        )[:TOP_PER_NODE]
+
+    def _subtree_top(self, node):
+        # The heaviest tags of a subtree either end at its root or are among
+        # the heaviest of one of its children, so merging one level is enough
+        tag_ids = set(node.terminals)
+        for child in node.children.values():
+            tag_ids.update(child.top)
+        return self._rank(tag_id for tag_id in tag_ids if tag_id in self.weights)
+
+    def set_weight(self, tag_id, name, weight):
+        """Insert a tag, or change its name or weight"""
+        if tag_id in self.names and self.names[tag_id] != name:
+            # Renamed: it moves to another path
+            self.remove(tag_id)
+        previous = self.weights.get(tag_id)
+        self.weights[tag_id] = weight
+        self.names[tag_id] = name
+        path = list(self._path(name))
+        path[-1].terminals.add(tag_id)
+        if previous is not None and weight < previous:
+            # The tag may have to give up its place to one not listed yet
+            for node in reversed(path):
+                node.top = self._subtree_top(node)
+        else:
+            for node in path:
+                node.top = self._rank(set(node.top) | {tag_id})
+
+    def add_weight(self, tag_id, delta):
+        if tag_id in self.weights:
+            self.set_weight(tag_id, self.names[tag_id], max(self.weights[tag_id] + delta, 0))
+
+    def remove(self, tag_id):
+        if tag_id not in self.weights:
+            return
+        path = list(self._path(self.names[tag_id]))
+        del self.weights[tag_id]
+        del self.names[tag_id]
+        path[-1].terminals.discard(tag_id)
+        for node in reversed(path):
+            node.top = self._subtree_top(node)
+
+    def complete(self, prefix, limit=TOP_PER_NODE):
+        node = self.root
+        for char in prefix.lower():
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return [(tag_id, self.names[tag_id], self.weights[tag_id]) for tag_id in node.top[:limit]]
+
+
+_trie = None
+_built_at = 0
+_lock = threading.Lock()
+
+
+def _build():
+    trie = TagTrie()
+    for tag_id, name, project_count in Tag.objects.annotate(project_count=Count('project')).values_list(
+        'pk', 'name', 'project_count'
+    ).iterator():
+        trie.set_weight(tag_id, name, project_count)
+    return trie
+
+
+def _get_trie():
+    global _trie, _built_at
+    with _lock:
+        if _trie is None or time.monotonic() - _built_at > TAG_TRIE_MAX_AGE:
+            _trie = _build()
+            _built_at = time.monotonic()
+        return _trie
+
+
+def complete_tags(prefix, limit=TOP_PER_NODE):
+    """[(tag id, name, project_count)] of the most used tags starting with `prefix`"""
+    prefix = prefix.strip()
+    if not prefix:
+        return []
+    trie = _get_trie()
+    with _lock:
+        return trie.complete(prefix, limit)
+
+
+def tag_saved(tag_id, name):
+    """A tag was created or possibly renamed"""
+    with _lock:
+        if _trie is not None:
+            _trie.set_weight(tag_id, name, _trie.weights.get(tag_id, 0))
+
+
+def tag_removed(tag_id):
+    with _lock:
+        if _trie is not None:
+            _trie.remove(tag_id)
+
+
+def tag_usage_changed(tag_ids, delta):
+    """`delta` more (or fewer) projects now use each of the tags `tag_ids`"""
+    with _lock:
+        if _trie is not None:
+            for tag_id in tag_ids:
+                _trie.add_weight(tag_id, delta)
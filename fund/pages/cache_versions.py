@@ -0,0 +1,38 @@
+"""
+Versioned cache namespaces.
+
+Cached fragments include their namespace's version in the key. Bumping the
+version (from the receivers in signals.py) makes every fragment of the
+namespace miss at once, with no need to know or delete individual keys.
+"""
+from django.core.cache import cache
+
+# Rendered sections of the home page (top rated, latest, featured)
+HOME_SECTIONS = 'home_sections'
+
+# Safety net for changes no signal sees, e.g. a project passing its end_date
+# or writes made through another process's cache
+HOME_SECTIONS_TIMEOUT = 60
+
+# Facet counts of the project list (see pages/facets.py)
+PROJECT_FACETS = 'project_facets'
+
+
+def _key(namespace):
+    return f'pages:version:{namespace}'
+
+
+def get_version(namespace):
+    version = cache.get(_key(namespace))
+    if version is None:
+        cache.add(_key(namespace), 1, None)
+        version = cache.get(_key(namespace), 1)
+    return version
+
+
+def bump_version(namespace):
+    try:
+        cache.incr(_key(namespace))
+    except ValueError:
+        # Not set yet (or evicted): any new value invalidates the old keys
+        cache.set(_key(namespace), get_version(namespace) + 1, None)
@@ -0,0 +1,80 @@
+"""
+Facet counts for the project list sidebar.
+
+Each dimension is counted with one GROUP BY over the projects matching the
+current filters, except the dimension's own filter (so picking a category
+still shows how many projects the other categories have). Results are
+cached per normalized filter set, under the PROJECT_FACETS cache version
+that project and tag writes bump. A fuzzy search is scored once per request
+by the caller and its ranked ids passed in, so the listing and the three
+dimensions don't each repeat the trigram queries.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache_versions import PROJECT_FACETS, get_version
+from .models import Project
+from .search import filter_projects
+
+# Safety net for changes no signal sees, e.g. a project passing its end_date
+FACET_CACHE_TIMEOUT = 30
+
+TOP_TAGS_LIMIT = 20
+
+
+def _cache_key(dimension, filters, version):
+    normalized = sorted((name, value) for name, value in filters.items() if value and name != dimension)
+    digest = hashlib.md5(repr(normalized).encode()).hexdigest()
+    return f'pages:facets:{version}:{dimension}:{digest}'
+
+
+def _count(dimension, filters, fuzzy_ids=None):
+    queryset = filter_projects(
+        Project.objects.with_effective_status(), filters, skip=(dimension,), fuzzy_ids=fuzzy_ids,
+    )
+    # order_by() drops the listing order (e.g. search_rank) from the GROUP BY
+    if dimension == 'category':
+        rows = queryset.order_by().values('category').annotate(count=Count('pk', distinct=True))
+        return {row['category']: row['count'] for row in rows}
+    if dimension == 'status':
+        rows = queryset.order_by().values('effective_status').annotate(count=Count('pk', distinct=True))
+        return {row['effective_status']: row['count'] for row in rows}
+    # tag: the most used tags among the matching projects
+    rows = (
+        queryset.order_by().filter(tags__isnull=False)
+        .values('tags__name').annotate(count=Count('pk', distinct=True))
+        .order_by('-count', 'tags__name')[:TOP_TAGS_LIMIT]
+    )
+    return [{'name': row['tags__name'], 'project_count': row['count']} for row in rows]
+
+
+def get_facet(dimension, filters, fuzzy_ids=None, version=None):
+    """
+    Cached counts for one dimension: 'category', 'status' or 'tag'. Pass the
+    ranked ids of a fuzzy search in `fuzzy_ids` (see fuzzy_ranked_ids()).
+    """
+    key = _cache_key(dimension, filters, version or get_version(PROJECT_FACETS))
+    counts = cache.get(key)
+    if counts is None:
+        counts = _count(dimension, filters, fuzzy_ids)
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+    return counts
+
+
+def project_facets(filters, fuzzy_ids=None):
+    """
+    Facets for the project list: (category_facets, status_facets, tag_facets)
+    where the first two are [(value, label, count)] in choice order.
+    """
+    version = get_version(PROJECT_FACETS)
+    category_counts = get_facet('category', filters, fuzzy_ids, version)
+    status_counts = get_facet('status', filters, fuzzy_ids, version)
+    category_facets = [
+        (value, label, category_counts.get(value, 0)) for value, label in Project.CATEGORY_CHOICES
+    ]
+    status_facets = [
+        (value, label, status_counts.get(value, 0)) for value, label in Project.STATUS_CHOICES
+    ]
+    return category_facets, status_facets, get_facet('tag', filters, fuzzy_ids, version)
@@ -305,10 +305,20 @@ class ProjectCreationForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields['tags'].required = False
+        # Only render the selected tags; others are found through the
+        # tag_autocomplete endpoint instead of shipping the whole table
+        self.fields['tags'].widget.choices = [
+            (tag.pk, tag.name) for tag in Tag.objects.filter(pk__in=self._selected_tag_ids())
+        ]
         # Set initial minimum for start date to current time (but don't enforce it)
         now = timezone.now()
         self.fields['start_date'].widget.attrs['min'] = now.strftime('%Y-%m-%dT%H:%M')
     
+    def _selected_tag_ids(self):
+        if self.is_bound:
+            return [pk for pk in self.data.getlist(self.add_prefix('tags')) if pk.isdigit()]
+        return [getattr(tag, 'pk', tag) for tag in self.initial.get('tags') or []]
+    
     def clean_start_date(self):
         start_date = self.cleaned_data.get('start_date')
         if start_date:
@@ -369,9 +379,8 @@ class ProjectCreationForm(forms.ModelForm):
             
             # Handle new tags
             new_tags = self.cleaned_data.get('new_tags', [])
-            for tag_name in new_tags:
-                tag, created = Tag.objects.get_or_create(name=tag_name.lower())  # Normalize to lowercase
-                project.tags.add(tag)
+            if new_tags:
+                project.tags.add(*Tag.get_or_create_many(new_tags))  # Normalized to lowercase
         
         return project
 
@@ -0,0 +1,296 @@
+"""
+Resized renditions ("variants") of uploaded images.
+
+Each variant is produced in a few widths, as WebP and JPEG, and stored under
+variants/<sha256 of the original>/<variant>-<width>.<format>. Keying by content
+hash means identical uploads share their renditions and a variant never has
+to be invalidated: a changed image has a different hash.
+
+Renditions are only ever rendered outside the page requests: by
+`manage.py process_images` for new project images and pictures (after
+normalizing their orientation, metadata and size) and new profile pictures,
+and for everything else by `manage.py generate_image_variants`.
+Each stored file then gets a small manifest listing its hash and rendered
+widths. Templates (templatetags/image_variants.py) read the manifest, once
+per cache period, and fall back to the original file while there is none.
+"""
+import hashlib
+import json
+import logging
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# name -> rendered widths (px), whether the image is cropped to a square, and
+# the default `sizes` attribute
+VARIANTS = {
+    'card': {'widths': (320, 640), 'square': False, 'sizes': '(max-width: 576px) 100vw, 400px'},
+    'detail': {'widths': (800, 1600), 'square': False, 'sizes': '(max-width: 992px) 100vw, 800px'},
+    'avatar': {'widths': (64, 160, 320), 'square': True, 'sizes': '160px'},
+}
+
+FORMATS = {
+    'webp': {'pil_format': 'WEBP', 'options': {'quality': 80, 'method': 4}},
+    'jpeg': {'pil_format': 'JPEG', 'options': {'quality': 82, 'optimize': True, 'progressive': True}},
+}
+
+VARIANTS_DIR = 'variants'
+
+HASH_CACHE_KEY = 'pages:image:hash:{name}'
+MANIFEST_CACHE_KEY = 'pages:image:manifest:{name}'
+CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Images without renditions yet are checked again after this many seconds
+MISSING_MANIFEST_TIMEOUT = 60
+
+
+def content_hash(field_file):
+    """SHA-256 of a stored file, computed once and then taken from the cache"""
+    # Content-addressed names carry it already
+    digest = getattr(field_file.storage, 'digest', lambda name: None)(field_file.name)
+    if digest:
+        return digest
+    key = HASH_CACHE_KEY.format(name=_name_key(field_file.name))
+    digest = cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            for chunk in iter(lambda: source.read(64 * 1024), b''):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        cache.set(key, digest, CACHE_TIMEOUT)
+    return digest
+
+
+def variant_name(digest, variant, width, fmt):
+    return f'{VARIANTS_DIR}/{digest[:2]}/{digest}/{variant}-{width}.{fmt}'
+
+
+def _name_key(name):
+    return hashlib.md5(name.encode()).hexdigest()
+
+
+def manifest_name(name):
+    """Where the manifest of the renditions of the stored file `name` lives"""
+    key = _name_key(name)
+    return f'{VARIANTS_DIR}/manifests/{key[:2]}/{key}.json'
+
+
+def _render(image, width, square, fmt):
+    if square:
+        side = min(width, image.width, image.height)
+        resized = ImageOps.fit(image, (side, side), Image.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)
+    if fmt == 'jpeg' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')
+    elif fmt == 'webp' and resized.mode not in ('RGB', 'RGBA'):
+        resized = resized.convert('RGBA' if 'A' in resized.getbands() else 'RGB')
+    buffer = BytesIO()
+    resized.save(buffer, FORMATS[fmt]['pil_format'], **FORMATS[fmt]['options'])
+    return buffer.getvalue()
+
+
+def generate_variant(field_file, variant, digest=None):
+    """
+    Write the missing renditions of one variant and return the widths that
+    exist (never wider than the original), or [] if the file is no image.
+    """
+    digest = digest or content_hash(field_file)
+    spec = VARIANTS[variant]
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image.load()
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Cannot create %s variant of %s', variant, field_file.name, exc_info=True)
+        return []
+
+    original = min(image.width, image.height) if spec['square'] else image.width
+    widths = sorted({min(width, original) for width in spec['widths']})
+    for width in widths:
+        for fmt in FORMATS:
+            name = variant_name(digest, variant, width, fmt)
+            if not default_storage.exists(name):
+                default_storage.save(name, ContentFile(_render(image, width, spec['square'], fmt)))
+    return widths
+
+
+def read_manifest(name):
+    """{'digest': ..., 'variants': {variant: widths}} of a stored file, {} if none was written"""
+    key = MANIFEST_CACHE_KEY.format(name=_name_key(name))
+    manifest = cache.get(key)
+    if manifest is None:
+        try:
+            with default_storage.open(manifest_name(name), 'rb') as source:
+                manifest = json.load(source)
+        except (OSError, ValueError):
+            manifest = {}
+        cache.set(key, manifest, CACHE_TIMEOUT if manifest else MISSING_MANIFEST_TIMEOUT)
+    return manifest
+
+
+def render_variants(field_file, variants):
+    """
+    Render the renditions of `variants` that are missing and record them in
+    the manifest of `field_file`. Returns {variant: widths}. Not for use in
+    page requests: this decodes the image and encodes every rendition.
+    """
+    digest = content_hash(field_file)
+    rendered = {variant: generate_variant(field_file, variant, digest) for variant in variants}
+
+    name = manifest_name(field_file.name)
+    manifest = read_manifest(field_file.name)
+    if manifest.get('digest') != digest:
+        manifest = {'digest': digest, 'variants': {}}
+    manifest['variants'].update({variant: widths for variant, widths in rendered.items() if widths})
+    if manifest['variants']:
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(json.dumps(manifest).encode()))
+        cache.set(MANIFEST_CACHE_KEY.format(name=_name_key(field_file.name)), manifest, CACHE_TIMEOUT)
+    return rendered
+
+
+def rendered_variant(field_file, variant):
+    """
+    (digest, widths) of the renditions of `field_file` that exist already,
+    (None, []) when there are none. Never renders or hashes anything.
+    """
+    manifest = read_manifest(field_file.name)
+    widths = manifest.get('variants', {}).get(variant, [])
+    return (manifest['digest'], widths) if widths else (None, [])
+
+
+def move_manifest(old_name, new_name):
+    """Let the file stored as `new_name` use the renditions recorded for `old_name`"""
+    manifest = read_manifest(old_name)
+    delete_renditions(old_name)
+    if manifest:
+        default_storage.delete(manifest_name(new_name))
+        default_storage.save(manifest_name(new_name), ContentFile(json.dumps(manifest).encode()))
+        cache.set(MANIFEST_CACHE_KEY.format(name=_name_key(new_name)), manifest, CACHE_TIMEOUT)
+
+
+def delete_renditions(name, digest=None):
+    """
+    Delete the manifest of the stored file `name` and, given the `digest` of
+    a content no stored file has any more, every rendition of that content.
+    """
+    default_storage.delete(manifest_name(name))
+    cache.delete_many([
+        MANIFEST_CACHE_KEY.format(name=_name_key(name)), HASH_CACHE_KEY.format(name=_name_key(name)),
+    ])
+    if digest:
+        directory = f'{VARIANTS_DIR}/{digest[:2]}/{digest}'
+        try:
+            files = default_storage.listdir(directory)[1]
+        except FileNotFoundError:
+            files = []
+        for filename in files:
+            default_storage.delete(f'{directory}/{filename}')
+
+
+def srcset(digest, variant, widths, fmt):
+    return ', '.join(
+        f'{default_storage.url(variant_name(digest, variant, width, fmt))} {width}w' for width in widths
+    )
+
+
+def variant_sources(field_file, variant, fmt='jpeg'):
+    """
+    (src, srcset) of the existing `variant` renditions of `field_file`, for
+    markup built outside templates; the original's url and '' until they exist
+    """
+    digest, widths = rendered_variant(field_file, variant)
+    if not widths:
+        return field_file.url, ''
+    return default_storage.url(variant_name(digest, variant, widths[-1], fmt)), srcset(digest, variant, widths, fmt)
+
+
+# Normalization of uploaded project images and pictures (see process_upload)
+MAX_DIMENSION = 2400
+PICTURE_VARIANTS = ('card', 'detail')
+PROFILE_PICTURE_VARIANTS = ('avatar',)
+
+
+def normalize_upload(field_file):
+    """
+    Re-encode an uploaded image: apply and drop the EXIF orientation (and all
+    other metadata), cap its longest side at MAX_DIMENSION and recompress it.
+    Returns the name of the new file. The original is left to
+    `manage.py collect_media`, other rows may share it.
+    """
+    storage = field_file.storage
+    with storage.open(field_file.name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+
+    buffer = BytesIO()
+    stem = field_file.name.rsplit('.', 1)[0]
+    if 'A' in image.getbands() or image.mode == 'P':
+        # Keep transparency
+        image.save(buffer, 'PNG', optimize=True)
+        name = f'{stem}.png'
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True, progressive=True)
+        name = f'{stem}.jpg'
+
+    return storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def process_upload(instance):
+    """
+    Normalize the pending `image` of a Project or ProjectPicture and render its
+    variants. Returns False if another worker got to it first.
+    """
+    model = type(instance)
+    claimed = model.objects.filter(pk=instance.pk, processing_status='pending').update(
+        processing_status='processing', processing_started_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    try:
+        # A project may have no main image; there is nothing to do then
+        if instance.image:
+            instance.image.name = normalize_upload(instance.image)
+            render_variants(instance.image, PICTURE_VARIANTS)
+    except Exception as error:
+        # Whatever went wrong, the row must not stay claimed
+        logger.warning('Processing %s %s failed', model.__name__, instance.pk, exc_info=True)
+        instance.processing_status = 'failed'
+        instance.processing_error = str(error) or type(error).__name__
+    else:
+        instance.processing_status = 'ready'
+        instance.processing_error = ''
+    instance.save(update_fields=['image', 'processing_status', 'processing_error'])
+    return True
+
+
+def process_profile_picture(user):
+    """
+    Render the avatar variants of a user's new profile picture. Returns False
+    if another worker got to it first. A picture that can't be rendered is
+    left as it is; templates keep showing the original.
+    """
+    claimed = type(user).objects.filter(pk=user.pk, profile_picture_pending=True).update(
+        profile_picture_pending=False
+    )
+    if not claimed:
+        return False
+
+    if user.profile_picture:
+        try:
+            render_variants(user.profile_picture, PROFILE_PICTURE_VARIANTS)
+        except Exception:
+            logger.warning('Rendering the profile picture of user %s failed', user.pk, exc_info=True)
+    return True
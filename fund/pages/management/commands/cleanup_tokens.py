@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from pages.models import ActivationToken, PasswordResetToken
+from pages.tokens import TokenService
+
+
+class Command(BaseCommand):
+    help = 'Clean up expired activation and password reset tokens'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Delete all tokens, not just expired ones',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            activation_count = ActivationToken.objects.all().delete()[0]
+            password_count = PasswordResetToken.objects.all().delete()[0]
+            kind = ''
+        else:
+            activation_count, password_count = TokenService.cleanup_expired_tokens()
+            kind = 'expired '
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Successfully cleaned up {activation_count} {kind}activation tokens '
+                f'and {password_count} {kind}password reset tokens'
+            )
+        )
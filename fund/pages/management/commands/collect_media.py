@@ -0,0 +1,172 @@
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from pages.images import delete_renditions, move_manifest
+from pages.models import CustomUser, MediaBlob, Project, ProjectPicture
+from pages.storage import media_storage
+
+# Every column that can reference a stored file
+REFERENCES = [
+    (CustomUser, 'profile_picture'),
+    (Project, 'image'),
+    (ProjectPicture, 'image'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media files no row references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of files examined per batch (default: 500)',
+        )
+        parser.add_argument(
+            '--grace-hours',
+            type=float,
+            default=24,
+            help='Keep unreferenced files written more recently than this (default: 24)',
+        )
+        parser.add_argument(
+            '--recount',
+            action='store_true',
+            help='Recompute every reference count from the rows first',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='Move files uploaded before content addressing to their content-addressed '
+                 'names (sharing identical ones), then recompute every reference count',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report what would be deleted',
+        )
+
+    def referenced(self, names):
+        """The subset of `names` still used by some row"""
+        used = set()
+        for model, field in REFERENCES:
+            used.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+        return used
+
+    def backfill(self, chunk_size, dry_run):
+        """
+        Store every referenced file under its content-addressed name and point
+        the rows at it; returns how many files were (or would be) moved
+        """
+        moved = 0
+        addressed = set()
+        for model, field in REFERENCES:
+            names = (
+                model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).distinct().iterator(chunk_size=chunk_size)
+            )
+            legacy = []
+            for name in names:
+                if media_storage.digest(name):
+                    addressed.add(name)
+                else:
+                    legacy.append(name)
+            for name in legacy:
+                if dry_run:
+                    moved += 1
+                    continue
+                try:
+                    with media_storage.open(name, 'rb') as source:
+                        # Identical files end up under the same name
+                        new_name = media_storage.save(name, source)
+                except OSError:
+                    self.stderr.write(f'Cannot read {name}')
+                    continue
+                # Counted by recount() afterwards; the media receivers must not run
+                for other_model, other_field in REFERENCES:
+                    other_model.objects.filter(**{other_field: name}).update(**{other_field: new_name})
+                move_manifest(name, new_name)
+                media_storage.delete(name)
+                moved += 1
+
+        # Content-addressed files written before MediaBlob rows existed
+        addressed = list(addressed)
+        for start in range(0, len(addressed), chunk_size):
+            chunk = addressed[start:start + chunk_size]
+            known = set(MediaBlob.objects.filter(name__in=chunk).values_list('name', flat=True))
+            for name in chunk:
+                if name not in known and not dry_run and media_storage.exists(name):
+                    MediaBlob.touch(name, media_storage.digest(name), media_storage.size(name))
+        return moved
+
+    def recount(self, chunk_size):
+        counts = Counter()
+        for model, field in REFERENCES:
+            names = (
+                model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+                .values_list(field, flat=True).iterator(chunk_size=chunk_size)
+            )
+            counts.update(names)
+
+        last_pk = 0
+        while True:
+            blobs = list(MediaBlob.objects.filter(pk__gt=last_pk).order_by('pk')[:chunk_size])
+            if not blobs:
+                break
+            last_pk = blobs[-1].pk
+            for blob in blobs:
+                blob.ref_count = counts.get(blob.name, 0)
+            MediaBlob.objects.bulk_update(blobs, ['ref_count'])
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+
+        if options['backfill']:
+            moved = self.backfill(chunk_size, dry_run)
+            verb = 'Would move' if dry_run else 'Moved'
+            self.stdout.write(f'{verb} {moved} files to content-addressed names')
+        if (options['recount'] or options['backfill']) and not dry_run:
+            self.recount(chunk_size)
+
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        deleted = 0
+        freed = 0
+        last_pk = 0
+
+        while True:
+            # Candidates come from the orphan index; the rows are checked again
+            # before anything is deleted, in case a count drifted
+            candidates = list(
+                MediaBlob.objects.filter(pk__gt=last_pk, ref_count__lte=0, touched_at__lt=cutoff)
+                .order_by('pk')[:chunk_size]
+            )
+            if not candidates:
+                break
+            last_pk = candidates[-1].pk
+
+            used = self.referenced([blob.name for blob in candidates])
+            for blob in candidates:
+                if blob.name in used:
+                    continue
+                if not dry_run:
+                    # Re-check the count and age so an upload landing meanwhile wins
+                    removed, _ = MediaBlob.objects.filter(
+                        pk=blob.pk, ref_count__lte=0, touched_at__lt=cutoff
+                    ).delete()
+                    if not removed:
+                        continue
+                    media_storage.delete(blob.name)
+                    # The renditions go with the last file of their content
+                    shared = MediaBlob.objects.filter(sha256=blob.sha256).exists()
+                    delete_renditions(blob.name, None if shared else blob.sha256)
+                deleted += 1
+                freed += blob.size
+
+        verb = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(f'{verb} {deleted} unreferenced files ({freed / 1024 / 1024:.1f} MB)')
+        )
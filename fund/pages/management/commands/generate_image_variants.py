@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+
+from pages.images import VARIANTS, render_variants
+from pages.models import CustomUser, Project, ProjectPicture
+
+# (model, image field, variants rendered for it)
+IMAGE_FIELDS = [
+    (Project, 'image', ['card', 'detail']),
+    (ProjectPicture, 'image', ['card', 'detail']),
+    (CustomUser, 'profile_picture', ['avatar']),
+]
+
+
+class Command(BaseCommand):
+    help = 'Create the resized WebP/JPEG variants of every uploaded image ahead of time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--variant',
+            choices=sorted(VARIANTS),
+            help='Only create this variant',
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        failed = 0
+
+        for model, field, variants in IMAGE_FIELDS:
+            if options['variant']:
+                variants = [v for v in variants if v == options['variant']]
+            names = (
+                model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                .values_list(field, flat=True).iterator()
+            )
+            for name in names:
+                field_file = model._meta.get_field(field).attr_class(model(), model._meta.get_field(field), name)
+                try:
+                    rendered = render_variants(field_file, variants)
+                except OSError:
+                    # The original is missing from storage
+                    rendered = {}
+                for variant in variants:
+                    if rendered.get(variant):
+                        processed += 1
+                    else:
+                        failed += 1
+                        self.stderr.write(f'Could not create the {variant} variant of {name}')
+
+        self.stdout.write(self.style.SUCCESS(f'Created or found {processed} variants ({failed} failed)'))
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from pages.milestones import FANOUT_CHUNK_SIZE, detect_ending_soon, notify_pending
+
+
+class Command(BaseCommand):
+    help = 'Queue milestone emails (50%/100% funded, ending soon) for the donors of each project'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=FANOUT_CHUNK_SIZE,
+            help=f'Number of donors queued per transaction (default: {FANOUT_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--domain',
+            default=settings.SITE_DOMAIN,
+            help='Host used in the project links of the emails (default: the SITE_DOMAIN setting)',
+        )
+        parser.add_argument(
+            '--protocol',
+            default='https',
+            choices=['http', 'https'],
+            help='Scheme used in the project links of the emails (default: https)',
+        )
+
+    def handle(self, *args, **options):
+        if not options['domain']:
+            raise CommandError('Set SITE_DOMAIN (or pass --domain) so the emails can link to the projects')
+        detect_ending_soon()
+        milestones, queued = notify_pending(
+            options['chunk_size'], domain=options['domain'], protocol=options['protocol'],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Announced {milestones} milestones, queued {queued} emails (run send_outbox to deliver them)'
+            )
+        )
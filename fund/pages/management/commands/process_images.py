@@ -0,0 +1,97 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from pages.images import process_profile_picture, process_upload
+from pages.models import CustomUser, Project, ProjectPicture
+
+# Models whose `image` upload is normalized by this command
+PROCESSED_MODELS = (Project, ProjectPicture)
+
+
+class Command(BaseCommand):
+    help = (
+        'Normalize newly uploaded project images and pictures and render their variants, '
+        'and those of new profile pictures'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Number of pending uploads fetched at a time (default: 20)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling for new uploads',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds to wait between polls when nothing is pending with --loop (default: 2)',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Queue uploads that failed before for another attempt',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=30,
+            help='Minutes after which an upload still being processed is assumed '
+                 'abandoned by a crashed worker and queued again (default: 30)',
+        )
+
+    def requeue_stale(self, stale_after):
+        cutoff = timezone.now() - timedelta(minutes=stale_after)
+        for model in PROCESSED_MODELS:
+            model.objects.filter(processing_status='processing').filter(
+                Q(processing_started_at__lt=cutoff) | Q(processing_started_at__isnull=True)
+            ).update(processing_status='pending')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            for model in PROCESSED_MODELS:
+                model.objects.filter(processing_status='failed').update(processing_status='pending')
+
+        processed = 0
+        failed = 0
+        try:
+            while True:
+                self.requeue_stale(options['stale_after'])
+                pending = []
+                for model in PROCESSED_MODELS:
+                    pending.extend(
+                        model.objects.filter(processing_status='pending')
+                        .order_by('pk')[:options['batch_size']]
+                    )
+                users = list(
+                    CustomUser.objects.filter(profile_picture_pending=True)
+                    .order_by('pk')[:options['batch_size']]
+                )
+                if not pending and not users:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                for instance in pending:
+                    if process_upload(instance):
+                        if instance.processing_status == 'ready':
+                            processed += 1
+                        else:
+                            failed += 1
+                for user in users:
+                    if process_profile_picture(user):
+                        processed += 1
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} uploads ({failed} failed)'))
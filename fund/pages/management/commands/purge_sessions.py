@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Delete expired sessions from the database in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of sessions to delete per statement (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE.endswith('signed_cookies'):
+            self.stdout.write('Sessions are stored in signed cookies, nothing to purge.')
+            return
+
+        batch_size = options['batch_size']
+        now = timezone.now()
+        deleted = 0
+
+        # Short DELETEs keep SQLite's write lock free for the web requests
+        # in between, unlike clearsessions' single statement
+        while True:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+
+        # Cached copies of these sessions expire on their own (their timeout
+        # is the session's age)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired sessions'))
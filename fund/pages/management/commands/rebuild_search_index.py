@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max
+
+from pages import search
+from pages.models import Project, SearchTrigram, Tag
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text and trigram search indexes for projects and tags'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of rows to index per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        if search.is_available():
+            indexed = self.rebuild_full_text(chunk_size)
+            self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} projects for full-text search'))
+        else:
+            self.stdout.write(self.style.WARNING(
+                'Full-text index not available on this database, skipping it (run migrate on SQLite with FTS5)'
+            ))
+
+        projects = self.rebuild_trigrams('project', Project.objects.all(), 'title', chunk_size)
+        tags = self.rebuild_trigrams('tag', Tag.objects.all(), 'name', chunk_size)
+        self.stdout.write(self.style.SUCCESS(f'Indexed {projects} project titles and {tags} tag names for fuzzy search'))
+
+    def rebuild_full_text(self, chunk_size):
+        last_id = Project.objects.aggregate(last=Max('pk'))['last'] or 0
+
+        # Re-index contiguous id ranges so each chunk is a bounded primary key
+        # scan; searches keep working on the old documents meanwhile
+        for first_id in range(0, last_id + 1, chunk_size):
+            with transaction.atomic():
+                search.index_projects(first_id, first_id + chunk_size - 1)
+
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE} WHERE rowid > %s', [last_id])
+            cursor.execute(f"INSERT INTO {search.FTS_TABLE}({search.FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f'SELECT COUNT(*) FROM {search.FTS_TABLE}')
+            return cursor.fetchone()[0]
+
+    def rebuild_trigrams(self, kind, queryset, field, chunk_size):
+        count = 0
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', field)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1][0]
+            with transaction.atomic():
+                SearchTrigram.objects.filter(kind=kind, object_id__in=[pk for pk, _ in chunk]).delete()
+                rows = []
+                for object_id, text in chunk:
+                    grams = SearchTrigram.trigrams(text)
+                    rows.extend(
+                        SearchTrigram(kind=kind, object_id=object_id, trigram=gram, size=len(grams))
+                        for gram in grams
+                    )
+                SearchTrigram.objects.bulk_create(rows)
+            count += len(chunk)
+
+        # Rows of objects deleted without signals (e.g. raw SQL)
+        SearchTrigram.objects.filter(kind=kind).exclude(object_id__in=queryset.values('pk')).delete()
+        return count
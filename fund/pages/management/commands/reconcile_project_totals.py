@@ -0,0 +1,84 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from pages.models import Donation, Project
+
+
+class Command(BaseCommand):
+    help = 'Rebuild Project.total_raised and Project.donor_count from the donation rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Number of projects to reconcile per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report drifted projects, do not write anything',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+
+        checked = 0
+        fixed = 0
+        last_pk = 0
+
+        while True:
+            with transaction.atomic():
+                # Walk projects by primary key so each chunk is an indexed range scan
+                projects = list(
+                    Project.objects.filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .only('pk', 'total_raised', 'donor_count')[:chunk_size]
+                )
+                if not projects:
+                    break
+
+                last_pk = projects[-1].pk
+                totals = {
+                    row['project_id']: row
+                    for row in Donation.objects.filter(project_id__in=[p.pk for p in projects])
+                    .order_by()
+                    .values('project_id')
+                    .annotate(total=Sum('amount'), count=Count('pk'))
+                }
+
+                drifted = []
+                for project in projects:
+                    row = totals.get(project.pk)
+                    total = row['total'] if row else Decimal('0.00')
+                    count = row['count'] if row else 0
+                    if project.total_raised != total or project.donor_count != count:
+                        drifted.append(project.pk)
+
+                if drifted and not dry_run:
+                    # Recompute inside a single UPDATE so donations landing meanwhile are not lost
+                    per_project = Donation.objects.filter(project=OuterRef('pk')).order_by().values('project')
+                    Project.objects.filter(pk__in=drifted).update(
+                        total_raised=Coalesce(
+                            Subquery(per_project.annotate(total=Sum('amount')).values('total')),
+                            Decimal('0.00'),
+                            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+                        ),
+                        donor_count=Coalesce(
+                            Subquery(per_project.annotate(count=Count('pk')).values('count')),
+                            0,
+                        ),
+                    )
+
+                checked += len(projects)
+                fixed += len(drifted)
+
+        verb = 'Found' if dry_run else 'Fixed'
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} projects. {verb} {fixed} with drifted totals.')
+        )
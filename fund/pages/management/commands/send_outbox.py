@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pages.outbox import send_batch
+
+
+class Command(BaseCommand):
+    help = 'Send the queued emails of the OutboundEmail outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Number of emails sent over one mail server connection (default: 50)',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, polling the outbox for new emails',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Seconds to wait between polls of an empty outbox with --loop (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = total_failed = 0
+
+        try:
+            while True:
+                sent, failed = send_batch(batch_size)
+                total_sent += sent
+                total_failed += failed
+                if sent + failed < batch_size:
+                    # Outbox drained (or only retries not due yet)
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Sent {total_sent} emails, {total_failed} failed (retried later, or given up after too many attempts)')
+        )
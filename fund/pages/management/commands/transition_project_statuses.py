@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from pages.transitions import TransitionTicker, apply_transitions, run_due_transitions
+
+
+class Command(BaseCommand):
+    help = 'Move projects to active/completed once their start or end date has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Apply transitions even if the cached next boundary has not passed',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, waking up at each upcoming boundary',
+        )
+
+    def handle(self, *args, **options):
+        if options['loop']:
+            self.stdout.write('Watching project start/end dates (Ctrl+C to stop)...')
+            try:
+                TransitionTicker().run()
+            except KeyboardInterrupt:
+                pass
+            return
+
+        if options['force']:
+            activated, completed = apply_transitions()
+        else:
+            activated, completed = run_due_transitions()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Activated {activated} projects and completed {completed} projects'
+            )
+        )
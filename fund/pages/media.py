@@ -0,0 +1,162 @@
+"""
+Serving of uploaded media (MEDIA_URL) in production.
+
+Every response carries an ETag, so repeat views are answered with 304
+without reading the file: the content hash for content-addressed uploads,
+the modification time and size for other files. Content-addressed uploads
+and image variants never change under their name and are cached by browsers
+for a year, other files for MEDIA_CACHE_MAX_AGE seconds.
+
+Single byte ranges are honoured (206/416); a request for several ranges gets
+the whole file. With settings.MEDIA_SENDFILE set to
+'x-sendfile' or 'x-accel-redirect' the body is left to the web server
+(Apache mod_xsendfile / nginx internal location at MEDIA_SENDFILE_PREFIX).
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .images import VARIANTS_DIR
+from .storage import ContentAddressedStorage
+
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _is_immutable(path):
+    if path.startswith(f'{VARIANTS_DIR}/'):
+        # Renditions never change, their manifests do
+        return not path.startswith(f'{VARIANTS_DIR}/manifests/')
+    return bool(ContentAddressedStorage.digest(path))
+
+
+def _etag(path, stat):
+    digest = ContentAddressedStorage.digest(path)
+    if digest:
+        # The name holds the SHA-256 of the content
+        return quote_etag(digest[:32])
+    # Anything else may be rewritten under the same name, which changes its
+    # modification time (and usually its size)
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(',')]
+    # If-None-Match uses weak comparison
+    return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def _byte_range(header, size):
+    """
+    (start, end) inclusive for a single satisfiable range, None to serve the
+    whole file, or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match:
+        # Malformed or multiple ranges: the whole file is a valid answer
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _stream(full_path, start, length):
+    with open(full_path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except (ValueError, SuspiciousFileOperation):
+        raise Http404('Invalid media path')
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = _etag(path, stat)
+    if _is_immutable(path):
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+    def finish(response):
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        return response
+
+    if _etag_matches(request.headers.get('If-None-Match'), etag):
+        return finish(HttpResponseNotModified())
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_SENDFILE:
+        # The web server sends the body (and handles ranges)
+        response = HttpResponse(content_type=content_type)
+        if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = settings.MEDIA_SENDFILE_PREFIX.rstrip('/') + '/' + path
+        else:
+            response['X-Sendfile'] = full_path
+        return finish(response)
+
+    size = stat.st_size
+    byte_range = None
+    range_header = request.headers.get('Range')
+    # A stale If-Range means the client's partial copy is outdated: send it all
+    if range_header and request.headers.get('If-Range', etag) == etag:
+        byte_range = _byte_range(range_header, size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return finish(response)
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    if request.method == 'HEAD':
+        response = HttpResponse(content_type=content_type)
+    else:
+        response = StreamingHttpResponse(_stream(full_path, start, length), content_type=content_type)
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return finish(response)
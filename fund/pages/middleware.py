@@ -1,13 +1,16 @@
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 from django.contrib.auth.models import AnonymousUser
 from .session_utils import get_user_user, get_admin_user
 
 class DualAuthenticationMiddleware(MiddlewareMixin):
     def process_request(self, request):
         # Leave request.user alone (Django handles it)
-        # Instead, add custom attributes
-        request.custom_user = get_user_user(request)
-        request.custom_admin = get_admin_user(request)
+        # Instead, add custom attributes. They are resolved on first use and
+        # share the per-request memo in session_utils, so requests that never
+        # look at them don't query the user table at all.
+        request.custom_user = SimpleLazyObject(lambda: get_user_user(request))
+        request.custom_admin = SimpleLazyObject(lambda: get_admin_user(request))
 
         # Safety: if request.user is None, set AnonymousUser
         if request.user is None:
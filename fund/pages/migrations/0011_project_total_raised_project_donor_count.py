@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:52
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Project = apps.get_model('pages', 'Project')
+    Donation = apps.get_model('pages', 'Donation')
+    per_project = Donation.objects.filter(project=OuterRef('pk')).order_by().values('project')
+    Project.objects.update(
+        total_raised=Coalesce(
+            Subquery(per_project.annotate(total=Sum('amount')).values('total')),
+            Decimal('0.00'),
+            output_field=models.DecimalField(max_digits=14, decimal_places=2),
+        ),
+        donor_count=Coalesce(
+            Subquery(per_project.annotate(count=Count('pk')).values('count')),
+            0,
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0010_alter_customuser_mobile_phone_alter_project_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='donor_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='total_raised',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
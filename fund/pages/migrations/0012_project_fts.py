@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+# Copied from pages.search as of this migration, so later changes there
+# don't alter what this migration does
+FTS_TABLE = 'pages_project_fts'
+
+CREATE_FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, description, tags, "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+)
+
+INDEX_PROJECTS_SQL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags) "
+    "SELECT p.id, p.title, p.description, COALESCE(("
+    "    SELECT group_concat(t.name, ' ') FROM pages_project_tags pt"
+    "    INNER JOIN pages_tag t ON t.id = pt.tag_id WHERE pt.project_id = p.id"
+    "), '') "
+    "FROM pages_project p"
+)
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases use the icontains fallback in pages.search
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_FTS_TABLE_SQL)
+    schema_editor.execute(INDEX_PROJECTS_SQL)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0011_project_total_raised_project_donor_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
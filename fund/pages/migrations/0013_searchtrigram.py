@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:57
+
+import re
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def trigrams(text):
+    """Distinct trigrams of each word, padded like pg_trgm (as of this migration)"""
+    grams = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def backfill_trigrams(apps, schema_editor):
+    SearchTrigram = apps.get_model('pages', 'SearchTrigram')
+    Project = apps.get_model('pages', 'Project')
+    Tag = apps.get_model('pages', 'Tag')
+    rows = []
+    for kind, model, field in (('project', Project, 'title'), ('tag', Tag, 'name')):
+        for object_id, text in model.objects.values_list('pk', field).iterator():
+            grams = trigrams(text)
+            rows.extend(
+                SearchTrigram(kind=kind, object_id=object_id, trigram=gram, size=len(grams))
+                for gram in grams
+            )
+            # Written as it goes, so memory doesn't grow with the table
+            if len(rows) >= BATCH_SIZE:
+                SearchTrigram.objects.bulk_create(rows)
+                rows = []
+    SearchTrigram.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0012_project_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('project', 'Project title'), ('tag', 'Tag name')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('trigram', models.CharField(max_length=3)),
+                ('size', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'trigram'], name='pages_trigram_lookup_idx'), models.Index(fields=['kind', 'object_id'], name='pages_trigram_object_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_trigrams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0013_searchtrigram'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='activationtoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='passwordresettoken',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
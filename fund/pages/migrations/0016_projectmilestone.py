@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0015_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectMilestone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('half_funded', '50% funded'), ('funded', '100% funded'), ('ending_soon', 'Ending soon')], max_length=20)),
+                ('reached_at', models.DateTimeField(auto_now_add=True)),
+                ('last_notified_user_id', models.PositiveBigIntegerField(default=0)),
+                ('notified_at', models.DateTimeField(blank=True, null=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestones', to='pages.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['notified_at', 'reached_at'], name='pages_milestone_pending_idx')],
+                'unique_together': {('project', 'kind')},
+            },
+        ),
+    ]
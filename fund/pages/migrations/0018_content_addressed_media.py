@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:13
+
+import django.utils.timezone
+import pages.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0017_projectpicture_processing_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customuser',
+            name='profile_picture',
+            field=models.ImageField(blank=True, null=True, storage=pages.storage.get_media_storage, upload_to='profile_pictures/', verbose_name='profile picture'),
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=pages.storage.get_media_storage, upload_to='project_images/'),
+        ),
+        migrations.AlterField(
+            model_name='projectpicture',
+            name='image',
+            field=models.ImageField(storage=pages.storage.get_media_storage, upload_to='project_pictures/'),
+        ),
+        migrations.CreateModel(
+            name='MediaBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('sha256', models.CharField(max_length=64)),
+                ('size', models.PositiveBigIntegerField()),
+                ('ref_count', models.IntegerField(default=0)),
+                ('touched_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'touched_at'], name='pages_mediablob_orphan_idx')],
+            },
+        ),
+    ]
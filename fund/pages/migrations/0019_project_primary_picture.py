@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_primary_picture(apps, schema_editor):
+    Project = apps.get_model('pages', 'Project')
+    ProjectPicture = apps.get_model('pages', 'ProjectPicture')
+    picture = ProjectPicture.objects.filter(project_id=OuterRef('pk')).order_by(
+        '-is_primary', 'uploaded_at'
+    ).values('pk')[:1]
+    Project.objects.update(primary_picture=Subquery(picture))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0018_content_addressed_media'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='primary_picture',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='pages.projectpicture'),
+        ),
+        migrations.RunPython(backfill_primary_picture, migrations.RunPython.noop),
+    ]
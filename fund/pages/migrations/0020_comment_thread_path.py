@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:19
+
+from collections import Counter
+
+from django.db import migrations, models
+
+PATH_STEP = 10
+
+
+def backfill_threads(apps, schema_editor):
+    Comment = apps.get_model('pages', 'Comment')
+    paths = {}
+    reply_counts = Counter()
+    # A parent always has a lower id than its replies
+    for pk, parent_id in Comment.objects.order_by('pk').values_list('pk', 'parent_id').iterator():
+        paths[pk] = f"{paths.get(parent_id, '')}{pk:0{PATH_STEP}d}/"
+        if parent_id:
+            reply_counts[parent_id] += 1
+    Comment.objects.bulk_update(
+        [Comment(pk=pk, path=path, reply_count=reply_counts[pk]) for pk, path in paths.items()],
+        ['path', 'reply_count'],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0019_project_primary_picture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['project', 'parent', '-created_at', '-id'], name='pages_comment_thread_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['path'], name='pages_comment_path_idx'),
+        ),
+        migrations.RunPython(backfill_threads, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0020_comment_thread_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='processing_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='processing_status',
+            # Images uploaded before processing existed are served as they are
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='ready', max_length=10),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='project',
+            name='processing_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='projectpicture',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
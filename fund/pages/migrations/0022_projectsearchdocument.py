@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:36
+
+import django.db.models.deletion
+import pages.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0021_image_processing_recovery'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectSearchDocument',
+            fields=[
+                ('project', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='pages.project')),
+                ('document', pages.models.FullTextDocumentField(db_column='pages_project_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'pages_project_fts',
+                'managed': False,
+            },
+        ),
+    ]
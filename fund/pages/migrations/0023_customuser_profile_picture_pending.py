@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pages', '0022_projectsearchdocument'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_pending',
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+    ]
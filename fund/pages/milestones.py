@@ -0,0 +1,104 @@
+"""
+Donor notifications for project milestones.
+
+Funding milestones (50% / 100% of the target) are recorded when a donation
+makes the total cross them (ProjectMilestone.detect_funding); "ending soon" ones by
+detect_ending_soon(). notify_pending() then fans each milestone out to the
+project's donors: donor ids are read in chunks in user id order, the email is
+rendered once per chunk and queued in the outbox together with the chunk's
+checkpoint, in one transaction. A crashed run therefore resumes after the
+last queued chunk without queueing anyone twice, and `manage.py send_outbox`
+delivers the emails over a pooled connection.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import CustomUser, Donation, OutboundEmail, Project, ProjectMilestone
+
+# Projects ending within this window get an "ending soon" milestone
+ENDING_SOON_WINDOW = timedelta(hours=48)
+
+FANOUT_CHUNK_SIZE = 500
+
+MILESTONE_SUBJECTS = {
+    'half_funded': '{title} is 50% funded',
+    'funded': '{title} reached its goal!',
+    'ending_soon': '{title} ends soon',
+}
+
+
+def detect_ending_soon(now=None):
+    """Record an ending_soon milestone for active projects about to end"""
+    now = now or timezone.now()
+    # The stored status lags behind the dates until the next transition run
+    project_ids = Project.objects.with_effective_status(now).filter(
+        effective_status='active', end_date__lte=now + ENDING_SOON_WINDOW,
+    ).values_list('pk', flat=True)
+    ProjectMilestone.objects.bulk_create(
+        [ProjectMilestone(project_id=pk, kind='ending_soon') for pk in project_ids],
+        ignore_conflicts=True,
+    )
+
+
+def _donor_chunk(milestone, chunk_size):
+    """
+    Next user ids (after the checkpoint) among the project's donors, and the
+    emails of the active ones
+    """
+    donor_ids = list(
+        Donation.objects.filter(project_id=milestone.project_id, user_id__gt=milestone.last_notified_user_id)
+        .order_by('user_id').values_list('user_id', flat=True).distinct()[:chunk_size]
+    )
+    emails = list(CustomUser.objects.filter(pk__in=donor_ids, is_active=True).values_list('email', flat=True))
+    return donor_ids, emails
+
+
+def fan_out(milestone, chunk_size=FANOUT_CHUNK_SIZE, domain=None, protocol='https'):
+    """Queue the milestone email for every donor not notified yet; return how many"""
+    domain = domain or settings.SITE_DOMAIN
+    if not domain:
+        raise ImproperlyConfigured('SITE_DOMAIN must be set to link to projects from milestone emails')
+    project = milestone.project
+    subject = MILESTONE_SUBJECTS[milestone.kind].format(title=project.title)
+    queued = 0
+
+    while True:
+        donor_ids, emails = _donor_chunk(milestone, chunk_size)
+        if not donor_ids:
+            break
+
+        # One rendering serves the whole chunk, the email is not personalized
+        html_message = render_to_string('pages/milestone_email.html', {
+            'project': project, 'milestone': milestone, 'domain': domain, 'protocol': protocol,
+        })
+        body = strip_tags(html_message)
+
+        with transaction.atomic():
+            OutboundEmail.objects.bulk_create([
+                OutboundEmail(to=email, subject=subject, body=body, html_body=html_message)
+                for email in emails
+            ])
+            milestone.last_notified_user_id = donor_ids[-1]
+            milestone.save(update_fields=['last_notified_user_id'])
+        queued += len(emails)
+
+    milestone.notified_at = timezone.now()
+    milestone.save(update_fields=['notified_at'])
+    return queued
+
+
+def notify_pending(chunk_size=FANOUT_CHUNK_SIZE, **kwargs):
+    """Fan out every milestone not announced yet; return (milestones, emails queued)"""
+    milestones = 0
+    queued = 0
+    pending = ProjectMilestone.objects.filter(notified_at__isnull=True).select_related('project').order_by('reached_at')
+    for milestone in list(pending):
+        queued += fan_out(milestone, chunk_size, **kwargs)
+        milestones += 1
+    return milestones, queued
@@ -1,14 +1,19 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Avg, Case, F, OuterRef, Subquery, Value, When
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.validators import RegexValidator, MinValueValidator
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
+import re
 import uuid
+from collections import Counter
 from datetime import timedelta
 from django.utils import timezone
 from django.utils.text import slugify
 from decimal import Decimal
 
+from .storage import get_media_storage
+
 
 class CustomUserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
@@ -70,9 +75,13 @@ class CustomUser(AbstractUser):
     profile_picture = models.ImageField(
         _('profile picture'),
         upload_to='profile_pictures/', 
+        storage=get_media_storage,
         blank=True, 
         null=True
     )
+    # A new profile picture whose avatar variants `manage.py process_images`
+    # has yet to render (see pages.images.process_profile_picture)
+    profile_picture_pending = models.BooleanField(default=False, db_index=True, editable=False)
     birthdate = models.DateField(_('birthdate'), blank=True, null=True)
     facebook_profile = models.URLField(_('facebook profile'), blank=True, null=True)
     country = models.CharField(_('country'), max_length=50, blank=True, null=True)
@@ -102,12 +111,156 @@ class CustomUser(AbstractUser):
 class Tag(models.Model):
     name = models.CharField(max_length=50, unique=True)
     
+    @classmethod
+    def get_or_create_many(cls, names):
+        """
+        Return the tags for `names` (normalized to lowercase), fetching the
+        existing ones in one query and creating only the missing ones.
+        """
+        names = list(dict.fromkeys(name.lower() for name in names))
+        existing = {tag.name: tag for tag in cls.objects.filter(name__in=names)}
+        tags = []
+        for name in names:
+            tag = existing.get(name)
+            if tag is None:
+                # Created one by one so the post_save receivers (search, autocomplete) run
+                tag, created = cls.objects.get_or_create(name=name)
+            tags.append(tag)
+        return tags
+    
     def __str__(self):
         return self.name
 
 
 
 
+# Uploads are stored as sent and then normalized by `manage.py process_images`
+IMAGE_PROCESSING_CHOICES = [
+    ('pending', 'Pending'),
+    ('processing', 'Processing'),
+    ('ready', 'Ready'),
+    ('failed', 'Failed'),
+]
+
+
+class ProjectQuerySet(models.QuerySet):
+    """Query helpers for project listings"""
+    
+    def with_card_stats(self):
+        """
+        Annotate everything a project card renders so templates don't issue
+        per-row queries: average rating, the primary picture, the creator
+        and the tags.
+        Funding totals are already stored on the row (total_raised/donor_count).
+        """
+        average = Rating.objects.filter(project=OuterRef('pk')).order_by().values('project').annotate(
+            avg=Avg('value')
+        ).values('avg')
+        return self.annotate(
+            avg_rating=Subquery(average),
+        ).select_related('creator', 'primary_picture').prefetch_related('tags')
+    
+    def with_effective_status(self, now=None):
+        """
+        Annotate `effective_status`, the status derived from the dates at read
+        time: canceled stays canceled, otherwise coming_soon before start_date,
+        completed from end_date on, active in between. Filtering on it is
+        always correct without waiting for the stored status to be updated.
+        """
+        now = now or timezone.now()
+        return self.annotate(
+            effective_status=Case(
+                When(status='canceled', then=Value('canceled')),
+                When(start_date__gt=now, then=Value('coming_soon')),
+                When(end_date__lte=now, then=Value('completed')),
+                default=Value('active'),
+                output_field=models.CharField(max_length=20),
+            )
+        )
+
+
+class FullTextMatch(models.Lookup):
+    """`document__match=expression`: an FTS5 MATCH against the whole row"""
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class FullTextDocumentField(models.TextField):
+    """The hidden column named after an FTS5 table, which MATCH takes as its left operand"""
+
+
+FullTextDocumentField.register_lookup(FullTextMatch)
+
+
+# A row of the pages_project_fts FTS5 table (created by migration 0012 on
+# SQLite, see pages.search), mapped so a search joins it on rowid and reads
+# its bm25 `rank` in the same query as the MATCH
+class ProjectSearchDocument(models.Model):
+    project = models.OneToOneField(
+        'Project', on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_document',
+    )
+    document = FullTextDocumentField(db_column='pages_project_fts')
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'pages_project_fts'
+
+
+# Trigram index rows backing typo-tolerant lookup of project titles and tag
+# names (see pages.search.fuzzy_search_projects)
+class SearchTrigram(models.Model):
+    KIND_CHOICES = [
+        ('project', 'Project title'),
+        ('tag', 'Tag name'),
+    ]
+    
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    trigram = models.CharField(max_length=3)
+    # Number of distinct trigrams of the indexed text, repeated on each row so
+    # similarity can be scored from the matching rows alone
+    size = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'trigram'], name='pages_trigram_lookup_idx'),
+            models.Index(fields=['kind', 'object_id'], name='pages_trigram_object_idx'),
+        ]
+    
+    @staticmethod
+    def trigrams(text):
+        """Distinct trigrams of each word, padded like pg_trgm ('  ab', ' ab', 'ab ')"""
+        grams = set()
+        for word in re.findall(r'\w+', text.lower()):
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return grams
+    
+    @classmethod
+    def index(cls, kind, object_id, text):
+        """Replace the trigram rows of one object"""
+        grams = cls.trigrams(text)
+        with transaction.atomic():
+            cls.objects.filter(kind=kind, object_id=object_id).delete()
+            cls.objects.bulk_create([
+                cls(kind=kind, object_id=object_id, trigram=gram, size=len(grams))
+                for gram in grams
+            ])
+    
+    @classmethod
+    def remove(cls, kind, object_id):
+        cls.objects.filter(kind=kind, object_id=object_id).delete()
+    
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: '{self.trigram}'"
+
+
 # Model for projects
 class Project(models.Model):
     # Project status choices
@@ -145,18 +298,42 @@ class Project(models.Model):
     )
     start_date = models.DateTimeField()
     end_date = models.DateTimeField()
-    image = models.ImageField(upload_to='project_images/', blank=True, null=True)
+    image = models.ImageField(upload_to='project_images/', storage=get_media_storage, blank=True, null=True)
+    # Processing of `image` (see pages.images.process_upload)
+    processing_status = models.CharField(
+        max_length=10, choices=IMAGE_PROCESSING_CHOICES, default='pending', db_index=True
+    )
+    processing_error = models.TextField(blank=True)
+    processing_started_at = models.DateTimeField(null=True, blank=True, editable=False)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
     is_featured = models.BooleanField(default=False)
     tags = models.ManyToManyField(Tag, blank=True)
     creator = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='projects')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ProjectQuerySet.as_manager()
+    
+    # Denormalized funding totals, maintained by Donation writes (see Donation.save
+    # and signals.donation_deleted) and rebuilt by `manage.py reconcile_project_totals`
+    total_raised = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    donor_count = models.PositiveIntegerField(default=0)
+    
+    # Fields only ever written through F() expressions, never from a stale instance
+    COUNTER_FIELDS = ('total_raised', 'donor_count')
+    
+    # Fields written by the picture receivers and the image worker, which a
+    # full save of a stale instance must not overwrite either
+    MAINTAINED_FIELDS = ('primary_picture', 'processing_status', 'processing_error', 'processing_started_at')
+    
+    # The picture main_image shows: the primary one, else the oldest. Kept by
+    # ProjectPicture.save and signals.picture_deleted (see refresh_primary_picture)
+    primary_picture = models.ForeignKey(
+        'ProjectPicture', on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='+'
+    )
+    
     # Calculate current total donations
     def current_donations(self):
-        from django.db.models import Sum
-        from decimal import Decimal
-        return self.donations.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        return self.total_raised
     
     # Calculate donation progress percentage
     def donation_progress(self):
@@ -167,7 +344,6 @@ class Project(models.Model):
     
     # Check if project can be canceled (donations < 25% of target)
     def can_cancel(self):
-        from decimal import Decimal
         current = self.current_donations()
         # Use Decimal for the multiplication
         return current < (self.target_amount * Decimal('0.25'))
@@ -180,7 +356,9 @@ class Project(models.Model):
     
     # Calculate average rating
     def average_rating(self):
-        from django.db.models import Avg
+        # Use the value annotated by with_card_stats() when available
+        if hasattr(self, 'avg_rating'):
+            return self.avg_rating or 0
         return self.ratings.aggregate(avg_rating=Avg('value'))['avg_rating'] or 0
     
     def clean(self):
@@ -195,6 +373,22 @@ class Project(models.Model):
     def __str__(self):
         return self.title
     
+    def get_effective_status(self):
+        """Status derived from the dates (see ProjectQuerySet.with_effective_status)"""
+        if hasattr(self, 'effective_status'):
+            return self.effective_status
+        if self.status == 'canceled':
+            return 'canceled'
+        now = timezone.now()
+        if self.start_date > now:
+            return 'coming_soon'
+        if self.end_date <= now:
+            return 'completed'
+        return 'active'
+    
+    def get_effective_status_display(self):
+        return dict(self.STATUS_CHOICES).get(self.get_effective_status())
+    
     def get_category_display_name(self):
         """Get the human-readable display name for the category"""
         return dict(self.CATEGORY_CHOICES).get(self.category, self.category)
@@ -217,15 +411,10 @@ class Project(models.Model):
         otherwise fallback to the single 'image' field,
         otherwise None.
         """
-        # Prefer primary picture
-        primary = self.pictures.filter(is_primary=True).first()
-        if primary:
-            return primary.image
-
-        # Fallback to any other uploaded picture
-        other = self.pictures.first()
-        if other:
-            return other.image
+        # primary_picture already holds the primary or first uploaded picture;
+        # listing querysets (with_card_stats) select it with the project
+        if self.primary_picture_id:
+            return self.primary_picture.image
 
         # Fallback to the legacy single-image field
         if self.image:
@@ -236,7 +425,7 @@ class Project(models.Model):
     
     @property
     def total_donations_count(self):
-        return self.donations.count()
+        return self.donor_count
     
     def get_days_remaining_display(self):
         """Get a user-friendly display of days remaining that works with status updates"""
@@ -275,21 +464,83 @@ class Project(models.Model):
         # Only run full validation if the instance is being created or dates/target are being changed
         if not self.pk or any(field in kwargs.get('update_fields', []) for field in ['start_date', 'end_date', 'target_amount']):
             self.full_clean()
+        
+        # Never write the counter columns (or the maintained fields) back from an
+        # in-memory copy, they may have moved since this instance was loaded
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS + self.MAINTAINED_FIELDS
+            ]
         super().save(*args, **kwargs)
+    
+    @classmethod
+    def apply_donation(cls, project_id, amount, count=1):
+        """Atomically add (or with negative values, remove) donations from the totals"""
+        # Donation.amount may still be a float/str on unsaved instances
+        amount = Decimal(str(amount))
+        cls.objects.filter(pk=project_id).update(
+            total_raised=F('total_raised') + amount,
+            donor_count=F('donor_count') + count,
+        )
+    
+    @classmethod
+    def refresh_primary_picture(cls, project_id):
+        """Point primary_picture at the picture main_image should show, in one UPDATE"""
+        # Same precedence as ProjectPicture.Meta.ordering: primary first, then oldest
+        picture = ProjectPicture.objects.filter(project_id=OuterRef('pk')).order_by(
+            '-is_primary', 'uploaded_at'
+        ).values('pk')[:1]
+        cls.objects.filter(pk=project_id).update(primary_picture=Subquery(picture))
 
 
 # Model for project images (optional if you want multiple images per project)
 class ProjectPicture(models.Model):
+    PROCESSING_STATUS_CHOICES = IMAGE_PROCESSING_CHOICES
+    
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='pictures')
-    image = models.ImageField(upload_to='project_pictures/')
+    image = models.ImageField(upload_to='project_pictures/', storage=get_media_storage)
     is_primary = models.BooleanField(default=False)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    processing_status = models.CharField(
+        max_length=10, choices=PROCESSING_STATUS_CHOICES, default='pending', db_index=True
+    )
+    processing_error = models.TextField(blank=True)
+    processing_started_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     def save(self, *args, **kwargs):
         # If this is set as primary, ensure no other primary exists for this project
-        if self.is_primary:
-            ProjectPicture.objects.filter(project=self.project, is_primary=True).update(is_primary=False)
+        update_fields = kwargs.get('update_fields')
+        if self.is_primary and (update_fields is None or 'is_primary' in update_fields):
+            ProjectPicture.objects.filter(
+                project_id=self.project_id, is_primary=True
+            ).exclude(pk=self.pk).update(is_primary=False)
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        
+        if update_fields is None or {'is_primary', 'project'} & set(update_fields):
+            project_ids = {self.project_id}
+            if not adding:
+                # The picture may have been moved away from its project
+                project_ids.update(Project.objects.filter(primary_picture=self).values_list('pk', flat=True))
+            for project_id in project_ids:
+                Project.refresh_primary_picture(project_id)
+    
+    @classmethod
+    def add_to_new_project(cls, project, images):
+        """
+        Create the pictures of a project that has none yet in one INSERT. The
+        first one is primary unless the project has a main image.
+        """
+        pictures = cls.objects.bulk_create([
+            cls(project=project, image=image, is_primary=(i == 0 and not project.image))
+            for i, image in enumerate(images)
+        ])
+        # bulk_create sends no post_save, so count the file references and
+        # pick the primary picture here
+        MediaBlob.add_refs([picture.image.name for picture in pictures])
+        Project.refresh_primary_picture(project.pk)
+        return pictures
     
     def __str__(self):
         return f"Image for {self.project.title}"
@@ -305,6 +556,26 @@ class Donation(models.Model):
     amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(1.00)])
     donated_at = models.DateTimeField(auto_now_add=True)
     
+    def save(self, *args, **kwargs):
+        # Keep Project.total_raised/donor_count in step with the donation rows
+        with transaction.atomic():
+            amount = Decimal(str(self.amount))
+            added = amount
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                Project.apply_donation(self.project_id, amount)
+            else:
+                previous = Donation.objects.select_for_update().filter(pk=self.pk).values('project_id', 'amount').first()
+                super().save(*args, **kwargs)
+                if previous:
+                    Project.apply_donation(previous['project_id'], -previous['amount'], count=-1)
+                    if previous['project_id'] == self.project_id:
+                        added -= previous['amount']
+                Project.apply_donation(self.project_id, amount)
+            # Notifications for the milestones this donation reaches are sent
+            # later by notify_milestones
+            ProjectMilestone.detect_funding(self.project_id, added)
+    
     def __str__(self):
         return f"{self.user.email} donated {self.amount} to {self.project.title}"
 
@@ -317,9 +588,62 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     is_reported = models.BooleanField(default=False)
+    # Number of direct replies, kept by save() and signals.comment_deleted
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    # Materialized path: the zero-padded ids from the top-level comment down to
+    # this one, each followed by '/'. Sorting by path lists a thread depth first
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    
+    PATH_STEP = 10
+    # Depth of the deepest comment whose path still fits the column
+    MAX_DEPTH = path.max_length // (PATH_STEP + 1) - 1
+    
+    # Fields only ever written through F() expressions, never from a stale instance
+    COUNTER_FIELDS = ('reply_count',)
+    
+    class Meta:
+        indexes = [
+            # Cursor pagination of a project's top-level comments, newest first
+            models.Index(fields=['project', 'parent', '-created_at', '-id'], name='pages_comment_thread_idx'),
+            models.Index(fields=['path'], name='pages_comment_path_idx'),
+        ]
     
     def is_reply(self):
-        return self.parent is not None
+        return self.parent_id is not None
+    
+    @property
+    def depth(self):
+        """0 for a top-level comment, 1 for its replies and so on"""
+        return len(self.path) // (self.PATH_STEP + 1) - 1
+    
+    def accepts_replies(self):
+        """Whether a reply to this comment would still be within MAX_DEPTH"""
+        return self.depth < self.MAX_DEPTH
+    
+    def subthread(self):
+        """Every reply below this comment, in thread order, in one path index range"""
+        # Descendant paths extend this one. '0' sorts right after '/', so they
+        # all fall between the path and the path with its '/' replaced by '0'
+        return Comment.objects.filter(path__gt=self.path, path__lt=self.path[:-1] + '0').order_by('path')
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            if kwargs.get('update_fields') is None:
+                kwargs['update_fields'] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name not in self.COUNTER_FIELDS
+                ]
+            super().save(*args, **kwargs)
+            return
+        
+        # The path ends with the id, which only exists after the INSERT
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            parent_path = self.parent.path if self.parent_id else ''
+            self.path = f'{parent_path}{self.pk:0{self.PATH_STEP}d}/'
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+            if self.parent_id:
+                Comment.objects.filter(pk=self.parent_id).update(reply_count=F('reply_count') + 1)
     
     def __str__(self):
         return f"Comment by {self.user.email} on {self.project.title}"
@@ -369,13 +693,21 @@ class ReportedComment(models.Model):
 
 # Email activation token model
 class ActivationToken(models.Model):
+    LIFETIME = timedelta(hours=24)
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     token = models.UUIDField(default=uuid.uuid4, unique=True)
     activation_code = models.CharField(max_length=6, blank=True, null=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
     def is_expired(self):
-        return timezone.now() > self.created_at + timedelta(hours=24)
+        return timezone.now() > self.created_at + self.LIFETIME
+
+    @classmethod
+    def delete_expired(cls, now=None):
+        """Delete every expired token in one statement; return how many"""
+        cutoff = (now or timezone.now()) - cls.LIFETIME
+        return cls.objects.filter(created_at__lt=cutoff).delete()[0]
     
     def generate_activation_code(self):
         """Generate a 6-digit activation code"""
@@ -390,12 +722,147 @@ class ActivationToken(models.Model):
 
 # Password reset token model
 class PasswordResetToken(models.Model):
+    LIFETIME = timedelta(hours=1)
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     token = models.UUIDField(default=uuid.uuid4, unique=True)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     
     def is_expired(self):
-        return timezone.now() > self.created_at + timedelta(hours=1)
+        return timezone.now() > self.created_at + self.LIFETIME
+
+    @classmethod
+    def delete_expired(cls, now=None):
+        """Delete every expired token in one statement; return how many"""
+        cutoff = (now or timezone.now()) - cls.LIFETIME
+        return cls.objects.filter(created_at__lt=cutoff).delete()[0]
+    
+    def __str__(self):
+        return f"Password reset token for {self.user.email}"
+
+# Outgoing email, written in the same transaction as whatever it announces and
+# sent later by `manage.py send_outbox`
+class OutboundEmail(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    to = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html_body = models.TextField(blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='pages_outbox_due_idx'),
+        ]
+    
+    @classmethod
+    def enqueue(cls, to, subject, html_message):
+        """Queue an HTML email (with its plain text version) for sending"""
+        from django.utils.html import strip_tags
+        return cls.objects.create(
+            to=to, subject=subject, body=strip_tags(html_message), html_body=html_message,
+        )
+    
+    def __str__(self):
+        return f"{self.subject} to {self.to} ({self.status})"
+
+
+# Funding/deadline milestones of a project, announced to its donors once by
+# `manage.py notify_milestones`
+class ProjectMilestone(models.Model):
+    KIND_CHOICES = [
+        ('half_funded', '50% funded'),
+        ('funded', '100% funded'),
+        ('ending_soon', 'Ending soon'),
+    ]
+    
+    # Share of the target (in percent) at which each funding milestone is reached
+    FUNDING_THRESHOLDS = [('half_funded', 50), ('funded', 100)]
+    
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='milestones')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    reached_at = models.DateTimeField(auto_now_add=True)
+    # Fan-out checkpoint: donors with a higher user id are still to be notified
+    last_notified_user_id = models.PositiveBigIntegerField(default=0)
+    notified_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = ('project', 'kind')
+        indexes = [
+            models.Index(fields=['notified_at', 'reached_at'], name='pages_milestone_pending_idx'),
+        ]
+    
+    @classmethod
+    def detect_funding(cls, project_id, added):
+        """
+        Record the funding milestones crossed by the donations that just added
+        `added` to the project's total
+        """
+        if added <= 0:
+            # A total going down crosses no threshold upwards
+            return
+        project = Project.objects.filter(pk=project_id).values('total_raised', 'target_amount').first()
+        if not project or not project['target_amount']:
+            return
+        new_total = project['total_raised']
+        old_total = new_total - added
+        target = project['target_amount']
+        reached = [
+            kind for kind, threshold in cls.FUNDING_THRESHOLDS
+            if old_total * 100 < threshold * target <= new_total * 100
+        ]
+        if not reached:
+            return
+        now = timezone.now()
+        cls.objects.bulk_create([
+            # Crossing both at once only announces the higher one
+            cls(project_id=project_id, kind=kind, notified_at=now if kind != reached[-1] else None)
+            for kind in reached
+        ], ignore_conflicts=True)
+    
+    def __str__(self):
+        return f"{self.project.title}: {self.get_kind_display()}"
+
+
+# A file of the content-addressed media storage (pages/storage.py) and how many
+# rows reference it
+class MediaBlob(models.Model):
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    ref_count = models.IntegerField(default=0)
+    # Last time the file was written or re-uploaded; protects fresh uploads
+    # whose rows are not saved yet from garbage collection
+    touched_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['ref_count', 'touched_at'], name='pages_mediablob_orphan_idx'),
+        ]
+    
+    @classmethod
+    def touch(cls, name, sha256, size):
+        if not cls.objects.filter(name=name).update(touched_at=timezone.now()):
+            cls.objects.get_or_create(name=name, defaults={'sha256': sha256, 'size': size})
+    
+    @classmethod
+    def add_refs(cls, names, delta=1):
+        """Count `delta` more (or fewer) references to each of `names` (once per occurrence)"""
+        by_count = {}
+        for name, count in Counter(name for name in names if name).items():
+            by_count.setdefault(count, []).append(name)
+        for count, group in by_count.items():
+            cls.objects.filter(name__in=group).update(ref_count=F('ref_count') + delta * count)
     
     def __str__(self):
-        return f"Password reset token for {self.user.email}"
\ No newline at end of file
+        return f"{self.name} ({self.ref_count} references)"
@@ -0,0 +1,87 @@
+"""
+Delivery of the OutboundEmail outbox.
+
+Views only insert OutboundEmail rows; `manage.py send_outbox` drains them in
+batches, reusing one SMTP connection per batch. A failed message is retried
+with exponential backoff (RETRY_BASE_DELAY, doubled per attempt) and marked
+'failed' after MAX_ATTEMPTS. Rows are not locked, so run a single worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BASE_DELAY = 60
+
+
+def due_emails(limit, now=None):
+    now = now or timezone.now()
+    return list(
+        OutboundEmail.objects.filter(status='pending', next_attempt_at__lte=now)
+        .order_by('next_attempt_at', 'pk')[:limit]
+    )
+
+
+def _build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, settings.DEFAULT_FROM_EMAIL, [email.to], connection=connection,
+    )
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _record_failure(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = 'failed'
+    else:
+        email.next_attempt_at = now + timedelta(seconds=RETRY_BASE_DELAY * 2 ** (email.attempts - 1))
+    email.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+
+
+def send_batch(batch_size=50, connection=None):
+    """
+    Send up to `batch_size` due emails over one connection.
+    Returns (sent, failed) counts for this batch.
+    """
+    emails = due_emails(batch_size)
+    if not emails:
+        return 0, 0
+
+    now = timezone.now()
+    connection = connection or get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        # The server is unreachable: every message of the batch is retried later
+        logger.warning('Could not connect to the mail server: %s', error)
+        for email in emails:
+            _record_failure(email, error, now)
+        return 0, len(emails)
+
+    sent = failed = 0
+    try:
+        for email in emails:
+            try:
+                _build_message(email, connection).send()
+            except Exception as error:
+                logger.warning('Sending outbox email %s failed: %s', email.pk, error)
+                _record_failure(email, error, now)
+                failed += 1
+            else:
+                OutboundEmail.objects.filter(pk=email.pk).update(
+                    status='sent', sent_at=timezone.now(), attempts=email.attempts + 1, last_error='',
+                )
+                sent += 1
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,174 @@
+"""
+Keyset (cursor) pagination and cached listing counts.
+
+A cursor holds the sort values of the last (or first) row of a page, so the
+next page is a `WHERE (key) > (cursor) ORDER BY key LIMIT n` range read:
+page 50 costs the same as page 1, unlike OFFSET. Cursors are signed so
+clients can't inject arbitrary filter values, and carry the ordering they
+were made for: a cursor of another sort is rejected instead of comparing,
+say, a date with an amount.
+"""
+import hashlib
+from datetime import datetime
+from decimal import Decimal
+
+from django.core import signing
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_SALT = 'pages.pagination.cursor'
+
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """One page of a CursorPaginator, with the cursors to its neighbours"""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return self.paginator.encode_cursor(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous:
+            return self.paginator.encode_cursor(self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """
+    Paginate `queryset` by `ordering` (e.g. ['-created_at', '-id']). The last
+    ordering field must be unique so every row has a distinct position.
+    """
+
+    def __init__(self, queryset, ordering, per_page):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.per_page = per_page
+
+    @staticmethod
+    def _field(ordering):
+        return ordering.lstrip('-')
+
+    def encode_cursor(self, obj):
+        values = []
+        for ordering in self.ordering:
+            value = getattr(obj, self._field(ordering))
+            # Stored as strings; the lookups convert them back to the field type
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, Decimal):
+                value = str(value)
+            values.append(value)
+        return signing.dumps({'ordering': self.ordering, 'values': values}, salt=CURSOR_SALT, compress=True)
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = signing.loads(cursor, salt=CURSOR_SALT)
+        except signing.BadSignature:
+            raise InvalidCursor(cursor)
+        if not isinstance(payload, dict) or payload.get('ordering') != self.ordering:
+            raise InvalidCursor(cursor)
+        values = payload.get('values')
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise InvalidCursor(cursor)
+        return values
+
+    def _after(self, values, reverse=False):
+        """Q for rows strictly after `values` in ordering (before, if reverse)"""
+        condition = Q()
+        equal = Q()
+        for ordering, value in zip(self.ordering, values):
+            field = self._field(ordering)
+            descending = ordering.startswith('-') != reverse
+            lookup = 'lt' if descending else 'gt'
+            condition |= equal & Q(**{f'{field}__{lookup}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def _reversed_ordering(self):
+        return [o[1:] if o.startswith('-') else f'-{o}' for o in self.ordering]
+
+    def page(self, after=None, before=None):
+        """
+        The page following the `after` cursor, preceding `before`, or the first
+        page. Raises InvalidCursor for a cursor that can't be used.
+        """
+        try:
+            return self._page(after, before)
+        except (ValidationError, TypeError, ValueError):
+            # The values don't convert to the ordering fields' types
+            raise InvalidCursor(after or before)
+
+    def _page(self, after, before):
+        if before:
+            values = self.decode_cursor(before)
+            rows = list(
+                self.queryset.filter(self._after(values, reverse=True))
+                .order_by(*self._reversed_ordering())[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            return CursorPage(rows[:self.per_page][::-1], self, has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset.order_by(*self.ordering)
+        if after:
+            queryset = queryset.filter(self._after(self.decode_cursor(after)))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return CursorPage(rows[:self.per_page], self, has_next=has_next, has_previous=bool(after))
+
+
+def cached_count(queryset, key_parts, timeout=COUNT_CACHE_TIMEOUT):
+    """
+    queryset.count(), cached for `timeout` seconds under a key built from
+    `key_parts` (the normalized filters that define the queryset).
+    """
+    digest = hashlib.md5(repr(sorted(key_parts.items())).encode()).hexdigest()
+    key = f'pages:count:{queryset.model._meta.label_lower}:{digest}'
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator whose total comes from cached_count()"""
+
+    def __init__(self, object_list, per_page, count_key, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list, self.count_key)
@@ -0,0 +1,210 @@
+"""
+Full-text project search backed by an SQLite FTS5 table.
+
+`pages_project_fts` holds one row per project (rowid = project id) with the
+title, description and space-separated tag names. It is kept in sync by the
+receivers in signals.py and can be rebuilt with
+`manage.py rebuild_search_index`. Searches join it through the unmanaged
+ProjectSearchDocument model. On databases without FTS5 the search falls back
+to icontains lookups.
+
+Typo-tolerant lookup (`fuzzy=1` on the project list) instead scores project
+titles and tag names by trigram similarity using the SearchTrigram rows.
+"""
+import re
+import time
+
+from django.db import connection
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Max, Q, Value, When
+from django.db.models.functions import Cast
+
+FTS_TABLE = 'pages_project_fts'
+
+# Fuzzy matching: minimum trigram similarity (0..1) and number of results kept
+FUZZY_THRESHOLD = 0.4
+FUZZY_RESULTS_LIMIT = 100
+
+CREATE_FTS_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, description, tags, "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+)
+
+# Document for a range of projects, tag names aggregated in the same statement
+INDEX_PROJECTS_SQL = (
+    f"INSERT INTO {FTS_TABLE} (rowid, title, description, tags) "
+    "SELECT p.id, p.title, p.description, COALESCE(("
+    "    SELECT group_concat(t.name, ' ') FROM pages_project_tags pt"
+    "    INNER JOIN pages_tag t ON t.id = pt.tag_id WHERE pt.project_id = p.id"
+    "), '') "
+    "FROM pages_project p WHERE p.id >= %s AND p.id <= %s"
+)
+
+# How long a failed availability check is trusted before looking again (the
+# table may be created by a later migrate or rebuild_search_index run)
+AVAILABILITY_RECHECK_SECONDS = 60
+
+_available = False
+_checked_at = None
+
+
+def is_available():
+    """Whether the FTS5 table exists on the default database"""
+    global _available, _checked_at
+    # Only a positive answer is kept for good
+    if not _available and (_checked_at is None or time.monotonic() - _checked_at > AVAILABILITY_RECHECK_SECONDS):
+        _available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+        _checked_at = time.monotonic()
+    return _available
+
+
+def build_match_expression(query):
+    """
+    Turn free text into a safe FTS5 MATCH expression: every word must match,
+    as a prefix, in any column. Returns '' when there is nothing to search for.
+    """
+    words = re.findall(r'\w+', query.lower())
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def index_projects(first_id, last_id):
+    """(Re)index every project whose id is in [first_id, last_id]"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid >= %s AND rowid <= %s", [first_id, last_id])
+        cursor.execute(INDEX_PROJECTS_SQL, [first_id, last_id])
+
+
+def index_project(project_id):
+    index_projects(project_id, project_id)
+
+
+def remove_project(project_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [project_id])
+
+
+def _no_results(queryset):
+    # Keep the search_rank annotation so callers can always order by it
+    return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+
+def search_projects(queryset, query):
+    """
+    Filter a Project queryset down to the projects matching `query` and
+    annotate `search_rank` (lowest = most relevant) for ordering.
+    """
+    if not is_available():
+        return queryset.filter(
+            Q(title__icontains=query) |
+            Q(description__icontains=query) |
+            Q(tags__name__icontains=query)
+        ).distinct().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+    match = build_match_expression(query)
+    if not match:
+        return _no_results(queryset)
+
+    # One MATCH: the FTS table is joined on rowid and its bm25 rank read in
+    # the same query (rank is negative, lower is more relevant)
+    return queryset.filter(search_document__document__match=match).annotate(
+        search_rank=F('search_document__rank')
+    )
+
+
+def similar_objects(kind, query, limit=FUZZY_RESULTS_LIMIT, threshold=FUZZY_THRESHOLD):
+    """
+    Top `limit` (object_id, similarity) pairs for `kind` ('project' or 'tag'),
+    best first. Similarity is the share of the query's trigrams found in the
+    indexed text (so a misspelt word still matches inside a longer title);
+    ties go to the shorter text. Only the index rows sharing a trigram with
+    the query are read.
+    """
+    from .models import SearchTrigram
+
+    grams = SearchTrigram.trigrams(query)
+    if not grams:
+        return []
+    rows = (
+        SearchTrigram.objects.filter(kind=kind, trigram__in=grams)
+        .values('object_id')
+        .annotate(shared=Count('pk'), size=Max('size'))
+        .annotate(similarity=ExpressionWrapper(
+            Cast('shared', FloatField()) / Value(float(len(grams))),
+            output_field=FloatField(),
+        ))
+        .filter(similarity__gte=threshold)
+        .order_by('-similarity', 'size', 'object_id')[:limit]
+    )
+    return [(row['object_id'], row['similarity']) for row in rows]
+
+
+def fuzzy_ranked_ids(query):
+    """
+    Ids of the projects whose title, or one of whose tags, is similar to
+    `query`, best first (at most FUZZY_RESULTS_LIMIT). Three queries; callers
+    filtering several querysets by the same search compute this once.
+    """
+    from .models import Project
+
+    scores = dict(similar_objects('project', query))
+
+    # A project scores as well as its best matching tag; the projects of all
+    # matching tags are read in one query
+    tag_scores = dict(similar_objects('tag', query))
+    links = Project.tags.through.objects.filter(tag_id__in=tag_scores).values_list('project_id', 'tag_id')
+    for project_id, tag_id in links:
+        if tag_scores[tag_id] > scores.get(project_id, 0):
+            scores[project_id] = tag_scores[tag_id]
+
+    # sorted() is stable, so equal scores keep the order similar_objects() gave
+    return sorted(scores, key=lambda pk: -scores[pk])[:FUZZY_RESULTS_LIMIT]
+
+
+def fuzzy_search_projects(queryset, query, ranked_ids=None):
+    """
+    Like search_projects(), but tolerant to typos: matches projects whose title,
+    or one of whose tags, is similar to `query`. Pass `ranked_ids` from
+    fuzzy_ranked_ids() to reuse them instead of scoring the query again.
+    """
+    ranked = list(fuzzy_ranked_ids(query) if ranked_ids is None else ranked_ids)
+    if not ranked:
+        return _no_results(queryset)
+    return queryset.filter(pk__in=ranked).annotate(
+        search_rank=Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked)],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def filter_projects(queryset, filters, skip=(), fuzzy_ids=None):
+    """
+    Apply the project list filters (category, status, search, fuzzy, tag) to
+    a queryset annotated with_effective_status(). Dimensions named in `skip`
+    are left out, which is how facet counts for that dimension are scoped.
+    `fuzzy_ids` are the fuzzy_ranked_ids() of the search, when already known.
+    """
+    if filters.get('category') and 'category' not in skip:
+        queryset = queryset.filter(category=filters['category'])
+    if filters.get('status') and 'status' not in skip:
+        queryset = queryset.filter(effective_status=filters['status'])
+
+    # Full-text search over name, description and tags, or the typo-tolerant
+    # match on name and tags
+    if filters.get('search') and 'search' not in skip:
+        if filters.get('fuzzy'):
+            queryset = fuzzy_search_projects(queryset, filters['search'], fuzzy_ids)
+        else:
+            queryset = search_projects(queryset, filters['search'])
+
+    # Tag-specific search (from the tag cloud)
+    if filters.get('tag') and 'tag' not in skip:
+        queryset = queryset.filter(tags__name__icontains=filters['tag']).distinct()
+    return queryset
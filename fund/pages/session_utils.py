@@ -1,38 +1,58 @@
 from django.contrib.auth import get_user_model
-from django.utils import timezone
-from pages.models import Project
+
+# Session keys holding the id of each independently logged in identity
+ADMIN_SESSION_KEY = 'admin_user_id'
+USER_SESSION_KEY = 'user_user_id'
+
+
+def _remember(request, session_key, user_id, user):
+    """Memoize the identity resolved for `user_id` on the request (see _resolve)"""
+    if not hasattr(request, '_session_identities'):
+        request._session_identities = {}
+    request._session_identities[session_key] = (str(user_id) if user_id else None, user)
+
+
+def _resolve(request, session_key):
+    """
+    Return the user whose id is stored under `session_key`, loading it at most
+    once per request: the middleware, the auth_status context processor and
+    the views all share the same lookup. The memo is keyed on the session
+    value, so logging in or out mid-request is picked up.
+    """
+    user_id = request.session.get(session_key)
+    cached = getattr(request, '_session_identities', {}).get(session_key)
+    if cached is not None and cached[0] == (str(user_id) if user_id else None):
+        return cached[1]
+
+    user = None
+    if user_id:
+        User = get_user_model()
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            user = None
+    _remember(request, session_key, user_id, user)
+    return user
 
 def set_admin_session(request, user):
     """Set admin session without affecting user session"""
-    request.session['admin_user_id'] = str(user.id)
-    request.session['admin_backend'] = 'pages.authentication_backends.AdminAuthenticationBackend'
+    request.session[ADMIN_SESSION_KEY] = str(user.id)
+    request.session['admin_backend'] = 'pages.authentication_backends.EmailAuthenticationBackend'
+    _remember(request, ADMIN_SESSION_KEY, user.id, user)
 
 def set_user_session(request, user):
     """Set user session without affecting admin session"""
-    request.session['user_user_id'] = str(user.id)
-    request.session['user_backend'] = 'pages.authentication_backends.UserAuthenticationBackend'
+    request.session[USER_SESSION_KEY] = str(user.id)
+    request.session['user_backend'] = 'pages.authentication_backends.EmailAuthenticationBackend'
+    _remember(request, USER_SESSION_KEY, user.id, user)
 
 def get_admin_user(request):
-    """Get admin user from session"""
-    User = get_user_model()
-    admin_user_id = request.session.get('admin_user_id')
-    if admin_user_id:
-        try:
-            return User.objects.get(pk=admin_user_id)
-        except User.DoesNotExist:
-            return None
-    return None
+    """Get admin user from session (memoized per request)"""
+    return _resolve(request, ADMIN_SESSION_KEY)
 
 def get_user_user(request):
-    """Get regular user from session"""
-    User = get_user_model()
-    user_user_id = request.session.get('user_user_id')
-    if user_user_id:
-        try:
-            return User.objects.get(pk=user_user_id)
-        except User.DoesNotExist:
-            return None
-    return None
+    """Get regular user from session (memoized per request)"""
+    return _resolve(request, USER_SESSION_KEY)
 
 def clear_admin_session(request):
     """Clear only admin session"""
@@ -40,6 +60,7 @@ def clear_admin_session(request):
         del request.session['admin_user_id']
     if 'admin_backend' in request.session:
         del request.session['admin_backend']
+    _remember(request, ADMIN_SESSION_KEY, None, None)
 
 def clear_user_session(request):
     """Clear only user session"""
@@ -47,6 +68,7 @@ def clear_user_session(request):
         del request.session['user_user_id']
     if 'user_backend' in request.session:
         del request.session['user_backend']
+    _remember(request, USER_SESSION_KEY, None, None)
 
 def is_admin_logged_in(request):
     """Check if admin is logged in"""
@@ -55,21 +77,3 @@ def is_admin_logged_in(request):
 def is_user_logged_in(request):
     """Check if user is logged in"""
     return get_user_user(request) is not None
-
-
-
-def update_project_statuses():
-    """Update status for all projects based on current time"""
-    now = timezone.now()
-    
-    # Mark projects that have ended as completed
-    Project.objects.filter(
-        end_date__lt=now, 
-        status='active'  # Only update active projects
-    ).update(status='completed')
-    
-    # Mark projects that haven't started yet as active
-    Project.objects.filter(
-        start_date__gt=now, 
-        status__in=['active']
-    ).update(status='active')
\ No newline at end of file
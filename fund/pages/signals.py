@@ -0,0 +1,200 @@
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import autocomplete, search
+from .cache_versions import HOME_SECTIONS, PROJECT_FACETS, bump_version
+from .models import Comment, CustomUser, Donation, MediaBlob, Project, ProjectPicture, Rating, SearchTrigram, Tag
+from .transitions import invalidate_next_transition
+
+
+def _project_deleted_too(origin, project_id):
+    """Whether the delete() call `origin` also deletes the project `project_id`"""
+    return project_id in getattr(origin, '_deleted_project_ids', ())
+
+
+@receiver(pre_delete, sender=Project)
+def project_deleting(sender, instance, origin=None, **kwargs):
+    # pre_delete fires for every collected row before anything is deleted, so
+    # the receivers of the project's cascaded rows can tell it is going away
+    if origin is not None:
+        if not hasattr(origin, '_deleted_project_ids'):
+            origin._deleted_project_ids = set()
+        origin._deleted_project_ids.add(instance.pk)
+
+
+@receiver(post_delete, sender=Donation)
+def donation_deleted(sender, instance, origin=None, **kwargs):
+    """Remove a deleted donation from its project's totals.
+
+    post_delete fires inside the deletion collector's transaction, so this also
+    covers queryset and cascade deletes (e.g. a donor deleting their account).
+    Donations cascading from their project's own deletion are skipped.
+    """
+    if _project_deleted_too(origin, instance.project_id):
+        return
+    Project.apply_donation(instance.project_id, -instance.amount, count=-1)
+
+
+@receiver(post_delete, sender=ProjectPicture)
+def picture_deleted(sender, instance, origin=None, **kwargs):
+    """Point the project at its next picture (SET_NULL only cleared the old one)"""
+    if _project_deleted_too(origin, instance.project_id):
+        return
+    Project.refresh_primary_picture(instance.project_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    """Take a deleted reply off its parent's reply_count"""
+    if instance.parent_id and not _project_deleted_too(origin, instance.project_id):
+        Comment.objects.filter(pk=instance.parent_id).update(reply_count=F('reply_count') - 1)
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, **kwargs):
+    """A new or edited project may bring the next status transition forward"""
+    invalidate_next_transition()
+    search.index_project(instance.pk)
+    SearchTrigram.index('project', instance.pk, instance.title)
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, **kwargs):
+    search.remove_project(instance.pk)
+    SearchTrigram.remove('project', instance.pk)
+
+
+@receiver(m2m_changed, sender=Project.tags.through)
+def project_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Re-index the projects whose tag names changed"""
+    if action not in ('post_add', 'post_remove', 'post_clear', 'pre_clear'):
+        return
+    if not reverse:
+        # project.tags.add/remove/clear()
+        if action != 'pre_clear':
+            search.index_project(instance.pk)
+        return
+    # tag.project_set.add/remove/clear(); on clear the affected ids are only known beforehand
+    if action == 'pre_clear':
+        instance._search_cleared_ids = list(instance.project_set.values_list('pk', flat=True))
+        return
+    project_ids = pk_set if action != 'post_clear' else getattr(instance, '_search_cleared_ids', [])
+    for project_id in project_ids:
+        search.index_project(project_id)
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    """A renamed tag changes the document of every project using it"""
+    SearchTrigram.index('tag', instance.pk, instance.name)
+    autocomplete.tag_saved(instance.pk, instance.name)
+    if created:
+        return
+    for project_id in instance.project_set.values_list('pk', flat=True):
+        search.index_project(project_id)
+
+
+@receiver(pre_delete, sender=Tag)
+def tag_deleting(sender, instance, **kwargs):
+    # The m2m rows are gone (without m2m_changed) by the time post_delete fires
+    instance._search_project_ids = list(instance.project_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, instance, **kwargs):
+    SearchTrigram.remove('tag', instance.pk)
+    autocomplete.tag_removed(instance.pk)
+    for project_id in getattr(instance, '_search_project_ids', []):
+        search.index_project(project_id)
+
+
+@receiver(m2m_changed, sender=Project.tags.through)
+def tag_usage_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the autocomplete weights (projects per tag) current"""
+    if action == 'pre_clear':
+        if reverse:
+            instance._autocomplete_cleared = instance.project_set.count()
+        else:
+            instance._autocomplete_cleared = list(instance.tags.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    delta = -1 if action in ('post_remove', 'post_clear') else 1
+    if reverse:
+        # tag.project_set changed: one tag, several projects
+        count = instance._autocomplete_cleared if action == 'post_clear' else len(pk_set)
+        autocomplete.tag_usage_changed([instance.pk], delta * count)
+    else:
+        # project.tags changed: several tags, one project each
+        tag_ids = instance._autocomplete_cleared if action == 'post_clear' else pk_set
+        autocomplete.tag_usage_changed(tag_ids, delta)
+
+
+def invalidate_home_sections(sender, **kwargs):
+    """Anything shown on a home page card changed"""
+    bump_version(HOME_SECTIONS)
+
+
+for model in (Project, Donation, Rating, ProjectPicture):
+    post_save.connect(invalidate_home_sections, sender=model, dispatch_uid=f'home_sections_save_{model.__name__}')
+    post_delete.connect(invalidate_home_sections, sender=model, dispatch_uid=f'home_sections_delete_{model.__name__}')
+
+
+def invalidate_project_facets(sender, action=None, **kwargs):
+    """A project's category, status or tags changed, or a tag was renamed"""
+    if action in (None, 'post_add', 'post_remove', 'post_clear'):
+        bump_version(PROJECT_FACETS)
+
+
+for model in (Project, Tag):
+    post_save.connect(invalidate_project_facets, sender=model, dispatch_uid=f'project_facets_save_{model.__name__}')
+    post_delete.connect(invalidate_project_facets, sender=model, dispatch_uid=f'project_facets_delete_{model.__name__}')
+m2m_changed.connect(invalidate_project_facets, sender=Project.tags.through, dispatch_uid='project_facets_tags')
+
+
+# Image fields stored in the content-addressed media storage
+MEDIA_FIELDS = {
+    CustomUser: ('profile_picture',),
+    Project: ('image',),
+    ProjectPicture: ('image',),
+}
+
+
+def remember_media(sender, instance, **kwargs):
+    """Note the stored file names as loaded, to see what a save replaces"""
+    # Read the raw values: a deferred field must not trigger a query here
+    stored = {}
+    for field in MEDIA_FIELDS[sender]:
+        if field in instance.__dict__:
+            value = instance.__dict__[field]
+            stored[field] = getattr(value, 'name', value) or ''
+    instance._stored_media = stored
+
+
+def count_media_references(sender, instance, created, update_fields=None, **kwargs):
+    """Move the MediaBlob references from the old file names to the new ones"""
+    stored = getattr(instance, '_stored_media', {})
+    for field in MEDIA_FIELDS[sender]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        new = getattr(instance, field).name or ''
+        old = '' if created else stored.get(field)
+        if old is None or new == old:
+            # Unknown (deferred) or unchanged
+            continue
+        MediaBlob.add_refs([new], 1)
+        MediaBlob.add_refs([old], -1)
+        stored[field] = new
+    instance._stored_media = stored
+
+
+def release_media(sender, instance, **kwargs):
+    MediaBlob.add_refs([getattr(instance, field).name for field in MEDIA_FIELDS[sender]], -1)
+
+
+for model in MEDIA_FIELDS:
+    post_init.connect(remember_media, sender=model, dispatch_uid=f'media_init_{model.__name__}')
+    post_save.connect(count_media_references, sender=model, dispatch_uid=f'media_save_{model.__name__}')
+    post_delete.connect(release_media, sender=model, dispatch_uid=f'media_delete_{model.__name__}')
@@ -0,0 +1,62 @@
+"""
+Content-addressed storage for uploaded images.
+
+Files are stored as <upload_to>/<first 2 hex>/<sha256><ext>, so uploading the
+same image twice writes it once and both rows point at the same file. Each
+file has a MediaBlob row whose ref_count is kept by the receivers in
+signals.py; files nobody references any more are removed, with their
+renditions, by `manage.py collect_media`. Files uploaded before are moved to
+content-addressed names by `manage.py collect_media --backfill`.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+DIGEST_RE = re.compile(r'(?:^|/)[0-9a-f]{2}/([0-9a-f]{64})(?:\.[^/.]*)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        # A name can only ever hold one content, so writing it again is harmless
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def digest(name):
+        """The SHA-256 a stored name was derived from, or None for other names"""
+        match = DIGEST_RE.search(name or '')
+        return match.group(1) if match else None
+
+    def _save(self, name, content):
+        from .models import MediaBlob
+
+        sha = hashlib.sha256()
+        size = 0
+        content.seek(0)
+        for chunk in content.chunks():
+            sha.update(chunk)
+            size += len(chunk)
+        content.seek(0)
+        digest = sha.hexdigest()
+
+        directory, filename = os.path.split(name)
+        if self.digest(name):
+            # Re-saving a stored file (e.g. after re-encoding it): keep its upload_to
+            directory = os.path.dirname(directory)
+        extension = os.path.splitext(filename)[1].lower()
+        name = os.path.join(directory, digest[:2], f'{digest}{extension}').replace('\\', '/')
+        if not self.exists(name):
+            name = super()._save(name, content)
+        MediaBlob.touch(name, digest, size)
+        return name
+
+
+media_storage = ContentAddressedStorage()
+
+
+def get_media_storage():
+    return media_storage
@@ -0,0 +1,41 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.utils.html import format_html, format_html_join
+
+from pages.images import VARIANTS, rendered_variant, srcset, variant_name
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(field_file, variant, sizes=None, **attrs):
+    """
+    Render an image field as a <picture> with WebP and JPEG srcsets of the
+    `variant` renditions, e.g.
+
+        {% responsive_image project.main_image 'card' class="card-img-top" alt=project.title %}
+
+    Extra keyword arguments become attributes of the <img>. Only renditions
+    that exist already are listed; until an image has been processed the
+    original file is shown.
+    """
+    if not field_file:
+        return ''
+    attrs.setdefault('loading', 'lazy')
+    img_attrs = format_html_join(' ', '{}="{}"', sorted(attrs.items()))
+
+    digest, widths = rendered_variant(field_file, variant)
+    if not widths:
+        return format_html('<img src="{}" {}>', field_file.url, img_attrs)
+
+    sizes = sizes or VARIANTS[variant]['sizes']
+    # display: contents keeps the <img> laid out as if it had no wrapper
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" {}>'
+        '</picture>',
+        srcset(digest, variant, widths, 'webp'), sizes,
+        default_storage.url(variant_name(digest, variant, widths[-1], 'jpeg')),
+        srcset(digest, variant, widths, 'jpeg'), sizes, img_attrs,
+    )
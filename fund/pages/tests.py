@@ -1,3 +1,1476 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password, make_password
+from django.contrib.sessions.models import Session
+from django.core import mail, signing
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, connection
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import autocomplete, search as project_search, transitions
+from .cache_versions import HOME_SECTIONS, get_version
+from .facets import project_facets
+from .forms import AdminAuthenticationForm, UserAuthenticationForm
+from .images import manifest_name, process_upload, read_manifest, render_variants, variant_name
+from .milestones import detect_ending_soon, notify_pending
+from .models import (
+    ActivationToken, Comment, CustomUser, Donation, MediaBlob, OutboundEmail, PasswordResetToken, Project,
+    ProjectMilestone, ProjectPicture, Rating, ReportedComment, Tag,
+)
+from .outbox import send_batch
+from .pagination import CURSOR_SALT, CursorPaginator, InvalidCursor, cached_count
+from .search import fuzzy_ranked_ids, fuzzy_search_projects, search_projects
+from .storage import ContentAddressedStorage
+from .throttle import THROTTLE_RATES, is_throttled, throttle_counts
+from .tokens import PASSWORD_RESET_SALT, TokenMiddleware, TokenService
+
+
+def use_temporary_media(test):
+    """Point MEDIA_ROOT at a directory that is removed after the test"""
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    test.enterContext(override_settings(MEDIA_ROOT=media_root))
+    return media_root
+
+
+def jpeg_upload(name='photo.jpg', size=(60, 40), color='orange', exif=None):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', **({'exif': exif} if exif else {}))
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class CursorPaginationTests(TestCase):
+    """Keyset pages walk the ordering both ways and refuse foreign cursors"""
+
+    def setUp(self):
+        cache.clear()
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.projects = [
+            Project.objects.create(
+                title=f'Project {n}', description='-', category='environment',
+                target_amount=Decimal('100.00'), creator=creator,
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+            )
+            for n in range(5)
+        ]
+        # Every row ties on created_at, so the id alone orders them
+        Project.objects.update(created_at=timezone.now())
+        self.paginator = CursorPaginator(Project.objects.all(), ['-created_at', '-id'], 2)
+
+    def ids(self, page):
+        return [project.id for project in page]
+
+    def test_next_and_previous_pages(self):
+        expected = [project.id for project in reversed(self.projects)]
+        first = self.paginator.page()
+        second = self.paginator.page(after=first.next_cursor)
+        third = self.paginator.page(after=second.next_cursor)
+        self.assertEqual(self.ids(first) + self.ids(second) + self.ids(third), expected)
+        self.assertFalse(first.has_previous())
+        self.assertFalse(third.has_next())
+
+        back = self.paginator.page(before=second.previous_cursor)
+        self.assertEqual(self.ids(back), self.ids(first))
+        self.assertFalse(back.has_previous())
+
+    def test_tampered_and_foreign_cursors_are_rejected(self):
+        cursor = self.paginator.page().next_cursor
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(after=cursor[:-2] + 'xx')
+        funded = CursorPaginator(Project.objects.all(), ['-total_raised', '-id'], 2)
+        with self.assertRaises(InvalidCursor):
+            funded.page(after=cursor)
+        # Correctly signed, but the values don't fit the fields
+        forged = signing.dumps(
+            {'ordering': ['-total_raised', '-id'], 'values': ['yesterday', 1]}, salt=CURSOR_SALT, compress=True,
+        )
+        with self.assertRaises(InvalidCursor):
+            funded.page(after=forged)
+
+    def test_listing_falls_back_to_the_first_page_on_a_foreign_cursor(self):
+        # Same ordering as the 'newest' sort
+        cursor = self.paginator.page().next_cursor
+        response = self.client.get(reverse('project_list'), {'sort': 'highest_funded', 'after': cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_count_is_cached_per_filter_set(self):
+        queryset = Project.objects.all()
+        self.assertEqual(cached_count(queryset, {'category': None}), 5)
+        Project.objects.filter(pk=self.projects[0].pk).delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(cached_count(queryset, {'category': None}), 5)
+        self.assertEqual(cached_count(queryset, {'category': 'environment'}), 4)
+
+
+class SessionUserResolutionTests(TestCase):
+    """The logged in user is loaded once per request, however many places ask for it"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='donor@example.com', password='secret-pass-123',
+            first_name='Dana', last_name='Donor', is_active=True,
+        )
+        session = self.client.session
+        session['user_user_id'] = str(self.user.id)
+        session.save()
+
+    def user_lookups(self, queries):
+        return [q for q in queries if 'FROM "pages_customuser" WHERE' in q['sql']]
+
+    def test_user_is_resolved_once_per_request(self):
+        url = reverse('my_projects')
+        # The first request also purges expired tokens
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # The view (get_user_user), the context processor (user_logged_in)
+        # and the base template (request.custom_user, set up by the
+        # middleware) all asked for the user...
+        self.assertEqual(response.wsgi_request.custom_user, self.user)
+        self.assertTrue(response.context['user_logged_in'])
+        self.assertContains(response, self.user.first_name)
+        # ...and it was loaded once
+        self.assertEqual(len(self.user_lookups(ctx.captured_queries)), 1)
+
+
+class LoginPasswordCheckTests(TestCase):
+    """A login hashes the submitted password exactly once"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='donor@example.com', password='secret-pass-123',
+            first_name='Dana', last_name='Donor', is_active=True,
+        )
+        self.admin = CustomUser.objects.create_user(
+            email='admin@example.com', password='secret-pass-123',
+            first_name='Ada', last_name='Admin', is_active=True, is_staff=True,
+        )
+
+    def count_checks(self):
+        return mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password)
+
+    def test_user_login_checks_password_once(self):
+        with self.count_checks() as checked:
+            response = self.client.post(
+                reverse('login'), {'username': self.user.email, 'password': 'secret-pass-123'}
+            )
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        self.assertEqual(checked.call_count, 1)
+
+    def test_admin_login_form_checks_password_once(self):
+        with self.count_checks() as checked:
+            form = AdminAuthenticationForm(None, data={'username': self.admin.email, 'password': 'secret-pass-123'})
+            self.assertTrue(form.is_valid())
+        self.assertEqual(form.get_user(), self.admin)
+        self.assertEqual(checked.call_count, 1)
+
+    def test_admin_is_sent_to_the_admin_login(self):
+        with self.count_checks() as checked:
+            form = UserAuthenticationForm(None, data={'username': self.admin.email, 'password': 'secret-pass-123'})
+            self.assertEqual(form.errors['__all__'][0], 'Please use the admin login page to access the admin site.')
+        self.assertEqual(checked.call_count, 1)
+
+    def test_unknown_email_hashes_the_password_once(self):
+        with self.count_checks() as checked, \
+                mock.patch('django.contrib.auth.base_user.make_password', wraps=make_password) as hashed:
+            response = self.client.post(reverse('login'), {'username': 'nobody@example.com', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+        # As slow as a wrong password: one hash, and no user to check it against
+        self.assertEqual((hashed.call_count, checked.call_count), (1, 0))
+
+
+class ThrottleTests(TestCase):
+    """Token buckets let bursts through, refill over time and are keyed per client"""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.now = 1000.0
+        patcher = mock.patch('pages.throttle.time.time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def attempt(self, ip='10.0.0.1', email='victim@example.com', scope='login'):
+        return is_throttled(self.factory.post('/', REMOTE_ADDR=ip), scope, email)
+
+    def attempts(self, count, **kwargs):
+        return [self.attempt(**kwargs) for _ in range(count)]
+
+    def test_burst_up_to_capacity_then_throttled(self):
+        capacity = THROTTLE_RATES['login']['email_ip'][0]
+        self.assertEqual(self.attempts(capacity), [False] * capacity)
+        with self.assertLogs('pages.throttle', 'WARNING'):
+            self.assertTrue(self.attempt())
+
+    def test_bucket_refills_over_its_period(self):
+        capacity, period = THROTTLE_RATES['login']['email_ip']
+        self.attempts(capacity)
+        self.now += period / capacity / 2
+        with self.assertLogs('pages.throttle', 'WARNING'):
+            self.assertTrue(self.attempt())
+        # One token back after period / capacity seconds
+        self.now += period / capacity / 2
+        self.assertFalse(self.attempt())
+        with self.assertLogs('pages.throttle', 'WARNING'):
+            self.assertTrue(self.attempt())
+
+    def test_guesses_from_one_client_leave_other_clients_in(self):
+        self.attempts(THROTTLE_RATES['login']['email_ip'][0])
+        # Another address can still log into the same account
+        self.assertFalse(self.attempt(ip='10.0.0.2'))
+
+    def test_guesses_spread_over_many_ips_are_limited(self):
+        capacity = THROTTLE_RATES['login']['email'][0]
+        for n in range(capacity):
+            self.assertFalse(self.attempt(ip=f'10.0.1.{n}'))
+        with self.assertLogs('pages.throttle', 'WARNING'):
+            self.assertTrue(self.attempt(ip='10.0.2.1'))
+        # Other accounts are unaffected
+        self.assertFalse(self.attempt(ip='10.0.2.1', email='other@example.com'))
+
+    @mock.patch('pages.throttle._local_counts', Counter())
+    def test_refused_attempts_are_counted(self):
+        self.attempts(THROTTLE_RATES['login']['email_ip'][0])
+        with self.assertLogs('pages.throttle', 'WARNING'):
+            self.attempt()
+            # Without a cache the count is kept in the process
+            with mock.patch('pages.throttle.cache.incr', side_effect=ConnectionError):
+                self.attempt()
+        counts = throttle_counts()
+        self.assertEqual(counts[('login', 'email_ip')], 2)
+        self.assertEqual(counts[('login', 'ip')], 0)
+
+    def test_ip_bucket_covers_every_email(self):
+        capacity = THROTTLE_RATES['login']['ip'][0]
+        for n in range(capacity):
+            self.assertFalse(self.attempt(email=f'user{n}@example.com'))
+        with self.assertLogs('pages.throttle', 'WARNING'):
+            self.assertTrue(self.attempt(email='other@example.com'))
+        self.assertFalse(self.attempt(ip='10.0.0.2', email='other@example.com'))
+
+
+class OutboxTests(TestCase):
+    """Emails are queued with their token and delivered by the outbox worker"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='new@example.com', password='secret-pass-123',
+            first_name='Nora', last_name='New',
+        )
+
+    def test_password_reset_is_queued_not_sent(self):
+        response = self.client.post(reverse('password_reset_request'), {'email': self.user.email})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(OutboundEmail.objects.filter(to=self.user.email, status='pending').count(), 1)
+        self.assertTrue(PasswordResetToken.objects.filter(user=self.user).exists())
+
+    def test_send_batch_delivers_over_one_connection(self):
+        for n in range(3):
+            OutboundEmail.enqueue(f'to{n}@example.com', 'Hello', '<p>Hi</p>')
+        self.assertEqual(send_batch(batch_size=10), (3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(OutboundEmail.objects.exclude(status='sent').exists())
+
+    def test_failed_email_is_retried_later(self):
+        email = OutboundEmail.enqueue('to@example.com', 'Hello', '<p>Hi</p>')
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=OSError('down')), \
+                self.assertLogs('pages.outbox', 'WARNING'):
+            self.assertEqual(send_batch(), (0, 1))
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), ('pending', 1))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        # Not due yet, so the next run leaves it alone
+        self.assertEqual(send_batch(), (0, 0))
+
+
+class ProjectCardQueryTests(TestCase):
+    """Pages listing project cards issue the same queries however many cards they show"""
+
+    def setUp(self):
+        cache.clear()
+        use_temporary_media(self)
+        self.creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.add_projects(3)
+        self.client.get(reverse('home'))  # token cleanup runs on the first request
+
+    def add_projects(self, count):
+        for n in range(count):
+            project = Project.objects.create(
+                title=f'Project {n}', description='-', category='environment', is_featured=True,
+                target_amount=Decimal('100.00'), creator=self.creator,
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+            )
+            project.tags.add(*Tag.get_or_create_many(['solar', f'tag{n}']))
+            ProjectPicture.objects.create(project=project, image=jpeg_upload(), is_primary=True)
+            Rating.objects.create(user=self.creator, project=project, value=4)
+            Donation.objects.create(user=self.creator, project=project, amount=Decimal('10.00'))
+
+    def assert_constant_queries(self, url, expected):
+        for count in (0, 4):
+            self.add_projects(count)
+            cache.clear()
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_home_page(self):
+        # Per section: the projects (with rating, creator and picture) and their tags
+        self.assert_constant_queries(reverse('home'), 6)
+
+    def test_project_list(self):
+        # Three facet counts, the page of projects, their tags and the total
+        self.assert_constant_queries(reverse('project_list'), 6)
+
+
+class HomeSectionCacheTests(TestCase):
+    """Writes to anything a home page card shows invalidate the cached sections"""
+
+    def setUp(self):
+        cache.clear()
+        use_temporary_media(self)
+        self.user = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='-', category='environment',
+            target_amount=Decimal('100.00'), creator=self.user,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def cached_fragment(self):
+        return cache.get(make_template_fragment_key('home_latest', [get_version(HOME_SECTIONS)]))
+
+    def rename_project(self):
+        self.project.title = 'Wind Pumps'
+        self.project.save()
+
+    def test_writes_bump_the_version(self):
+        writes = [
+            ('project save', self.rename_project),
+            ('donation save', lambda: Donation.objects.create(
+                user=self.user, project=self.project, amount=Decimal('5.00'),
+            )),
+            ('donation delete', lambda: Donation.objects.get().delete()),
+            ('rating save', lambda: Rating.objects.create(user=self.user, project=self.project, value=5)),
+            ('rating delete', lambda: Rating.objects.get().delete()),
+            ('picture save', lambda: ProjectPicture.objects.create(project=self.project, image=jpeg_upload())),
+            ('picture delete', lambda: ProjectPicture.objects.get().delete()),
+            ('project delete', lambda: self.project.delete()),
+        ]
+        for label, write in writes:
+            with self.subTest(label):
+                self.client.get(reverse('home'))
+                version = get_version(HOME_SECTIONS)
+                self.assertIsNotNone(self.cached_fragment())
+                write()
+                self.assertGreater(get_version(HOME_SECTIONS), version)
+                self.assertIsNone(self.cached_fragment())
+
+    def test_page_shows_the_change(self):
+        self.assertContains(self.client.get(reverse('home')), 'Solar Pumps')
+        self.rename_project()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Wind Pumps')
+        self.assertNotContains(response, 'Solar Pumps')
+
+
+class PurgeSessionsTests(TestCase):
+    """Expired sessions are deleted in batches, live ones are kept"""
+
+    def setUp(self):
+        now = timezone.now()
+        for n in range(7):
+            Session.objects.create(session_key=f'expired{n}', session_data='-', expire_date=now - timedelta(days=1))
+        for n in range(2):
+            Session.objects.create(session_key=f'live{n}', session_data='-', expire_date=now + timedelta(days=1))
+
+    def test_batches_include_the_partial_last_one(self):
+        stdout = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_sessions', batch_size=3, stdout=stdout)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual([sql.count("'expired") for sql in deletes], [3, 3, 1])
+        self.assertIn('Deleted 7 expired sessions', stdout.getvalue())
+        self.assertEqual(sorted(Session.objects.values_list('session_key', flat=True)), ['live0', 'live1'])
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies')
+    def test_signed_cookie_sessions_are_left_alone(self):
+        stdout = StringIO()
+        call_command('purge_sessions', stdout=stdout)
+        self.assertIn('nothing to purge', stdout.getvalue())
+        self.assertEqual(Session.objects.count(), 9)
+
+
+class DonationTotalsTests(TestCase):
+    """Project.total_raised/donor_count follow donation writes and can be reconciled"""
+
+    def setUp(self):
+        self.donor = CustomUser.objects.create_user(
+            email='donor@example.com', password='x', first_name='D', last_name='N', is_active=True,
+        )
+        self.projects = [
+            Project.objects.create(
+                title=title, description='-', category='environment',
+                target_amount=Decimal('1000.00'), creator=self.donor,
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+            )
+            for title in ('Pumps', 'Wells')
+        ]
+
+    def totals(self, project):
+        project.refresh_from_db()
+        return project.total_raised, project.donor_count
+
+    def donate(self, amount, project=None):
+        return Donation.objects.create(user=self.donor, project=project or self.projects[0], amount=Decimal(amount))
+
+    def test_create_edit_and_delete(self):
+        donation = self.donate('25.00')
+        self.donate('10.00')
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('35.00'), 2))
+
+        donation.amount = Decimal('40.00')
+        donation.save()
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('50.00'), 2))
+
+        donation.project = self.projects[1]
+        donation.save()
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('10.00'), 1))
+        self.assertEqual(self.totals(self.projects[1]), (Decimal('40.00'), 1))
+
+        donation.delete()
+        Donation.objects.filter(project=self.projects[0]).delete()
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('0.00'), 0))
+        self.assertEqual(self.totals(self.projects[1]), (Decimal('0.00'), 0))
+
+    def test_deleting_a_project_skips_the_per_donation_updates(self):
+        for _ in range(3):
+            self.donate('10.00')
+        with CaptureQueriesContext(connection) as ctx:
+            self.projects[0].delete()
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "pages_project"')])
+        self.assertFalse(Donation.objects.exists())
+
+    def test_deleting_a_donor_still_updates_other_projects(self):
+        other = CustomUser.objects.create_user(
+            email='other@example.com', password='x', first_name='O', last_name='T', is_active=True,
+        )
+        Donation.objects.create(user=other, project=self.projects[0], amount=Decimal('15.00'))
+        self.donate('5.00')
+        other.delete()
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('5.00'), 1))
+
+    def test_reconcile_fixes_drifted_totals(self):
+        self.donate('25.00')
+        Project.objects.update(total_raised=Decimal('999.00'), donor_count=7)
+
+        out = StringIO()
+        call_command('reconcile_project_totals', dry_run=True, stdout=out)
+        self.assertIn('Found 2', out.getvalue())
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('999.00'), 7))
+
+        call_command('reconcile_project_totals', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.totals(self.projects[0]), (Decimal('25.00'), 1))
+        self.assertEqual(self.totals(self.projects[1]), (Decimal('0.00'), 0))
+
+
+@override_settings(SITE_DOMAIN='fund.example.com')
+class MilestoneFanOutTests(TestCase):
+    """Donors are queued once per milestone, resuming from the checkpoint"""
+
+    def setUp(self):
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=creator,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+        self.donors = [
+            CustomUser.objects.create_user(
+                email=f'donor{n}@example.com', password='x', first_name='D', last_name=str(n), is_active=True,
+            )
+            for n in range(5)
+        ]
+
+    def test_funding_milestones_are_detected_on_donation(self):
+        Donation.objects.create(user=self.donors[0], project=self.project, amount=Decimal('60.00'))
+        self.assertEqual(list(self.project.milestones.values_list('kind', flat=True)), ['half_funded'])
+        Donation.objects.create(user=self.donors[1], project=self.project, amount=Decimal('40.00'))
+        self.assertEqual(self.project.milestones.count(), 2)
+
+    def test_only_donations_crossing_a_threshold_record_milestones(self):
+        Donation.objects.create(user=self.donors[0], project=self.project, amount=Decimal('60.00'))
+        self.project.milestones.all().delete()
+        # Already past 50%: the threshold is not crossed again, so no milestone
+        # INSERT after the savepoint, donation INSERT, totals UPDATE and SELECT
+        with self.assertNumQueries(5):
+            Donation.objects.create(user=self.donors[1], project=self.project, amount=Decimal('10.00'))
+        self.assertFalse(self.project.milestones.exists())
+        # Lowering an amount crosses nothing, the totals are not even read
+        donation = Donation.objects.get(user=self.donors[1])
+        donation.amount = Decimal('5.00')
+        with CaptureQueriesContext(connection) as ctx:
+            donation.save()
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT "pages_project"')])
+        self.assertFalse(self.project.milestones.exists())
+
+    def test_ending_soon_follows_the_effective_status(self):
+        now = timezone.now()
+        # Started and ending tomorrow, but not transitioned from coming_soon yet
+        Project.objects.filter(pk=self.project.pk).update(status='coming_soon', end_date=now + timedelta(hours=24))
+        canceled = Project.objects.create(
+            title='Canceled', description='-', category='environment',
+            target_amount=Decimal('100.00'), creator=self.project.creator,
+            start_date=now - timedelta(days=1), end_date=now + timedelta(hours=24), status='canceled',
+        )
+        detect_ending_soon(now)
+        self.assertEqual(
+            list(ProjectMilestone.objects.values_list('project_id', 'kind')), [(self.project.pk, 'ending_soon')]
+        )
+        self.assertFalse(canceled.milestones.exists())
+
+    @override_settings(SITE_DOMAIN='')
+    def test_command_requires_site_domain(self):
+        with self.assertRaises(CommandError):
+            call_command('notify_milestones', stdout=StringIO())
+        call_command('notify_milestones', domain='fund.example.com', stdout=StringIO())
+
+    def test_fan_out_resumes_without_requeueing(self):
+        for donor in self.donors:
+            Donation.objects.create(user=donor, project=self.project, amount=Decimal('10.00'))
+        Donation.objects.create(user=self.donors[0], project=self.project, amount=Decimal('10.00'))
+        milestone = self.project.milestones.get(kind='half_funded')
+
+        # A previous run queued the first two donors, then crashed
+        milestone.last_notified_user_id = self.donors[1].pk
+        milestone.save()
+        self.assertEqual(notify_pending(chunk_size=2), (1, 3))
+
+        self.assertEqual(
+            sorted(OutboundEmail.objects.values_list('to', flat=True)),
+            [f'donor{n}@example.com' for n in range(2, 5)],
+        )
+        self.assertEqual(notify_pending(chunk_size=2), (0, 0))
+
+
+class MediaServingTests(TestCase):
+    """serve_media answers conditional and range requests, or hands off to the web server"""
+
+    def setUp(self):
+        self.media_root = use_temporary_media(self)
+        self.content = bytes(range(100))
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.hashed_name = f'project_images/{self.digest[:2]}/{self.digest}.bin'
+        for name in (self.hashed_name, 'legacy/file.bin'):
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as target:
+                target.write(self.content)
+
+    def get(self, name, **headers):
+        return self.client.get(reverse('media', kwargs={'path': name}), headers=headers)
+
+    def test_etag_of_content_addressed_file_is_its_hash(self):
+        response = self.get(self.hashed_name)
+        self.assertEqual(response['ETag'], f'"{self.digest[:32]}"')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(self.get(self.hashed_name, if_none_match=response['ETag']).status_code, 304)
+
+    def test_etag_of_other_files_follows_modifications(self):
+        etag = self.get('legacy/file.bin')['ETag']
+        self.assertEqual(self.get('legacy/file.bin', if_none_match=f'W/{etag}').status_code, 304)
+        path = os.path.join(self.media_root, 'legacy/file.bin')
+        with open(path, 'wb') as target:
+            target.write(b'rewritten')
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+        response = self.get('legacy/file.bin', if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_single_and_suffix_ranges(self):
+        response = self.get('legacy/file.bin', range='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[10:20])
+
+        response = self.get('legacy/file.bin', range='bytes=-5')
+        self.assertEqual(response['Content-Range'], 'bytes 95-99/100')
+        self.assertEqual(b''.join(response.streaming_content), self.content[-5:])
+
+    def test_unsatisfiable_range(self):
+        response = self.get('legacy/file.bin', range='bytes=100-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */100')
+
+    def test_multiple_ranges_and_stale_if_range_get_the_whole_file(self):
+        response = self.get('legacy/file.bin', range='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], '100')
+        response = self.get('legacy/file.bin', range='bytes=0-9', if_range='"outdated"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_SENDFILE_PREFIX='/protected-media/')
+    def test_x_accel_redirect(self):
+        response = self.get(self.hashed_name)
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.hashed_name}')
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], f'"{self.digest[:32]}"')
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile(self):
+        response = self.get('legacy/file.bin')
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'legacy/file.bin'))
+        self.assertEqual(response.content, b'')
+
+    def test_paths_outside_media_root_are_not_found(self):
+        self.assertEqual(self.get('../settings.py').status_code, 404)
+
+
+class PrimaryPictureTests(TestCase):
+    """Project.primary_picture follows picture writes, so main_image needs no query"""
+
+    def setUp(self):
+        use_temporary_media(self)
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=creator,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def add_picture(self, content, **kwargs):
+        image = SimpleUploadedFile('picture.gif', b'GIF89a' + content, content_type='image/gif')
+        return ProjectPicture.objects.create(project=self.project, image=image, **kwargs)
+
+    def main_image_name(self):
+        project = Project.objects.with_card_stats().get(pk=self.project.pk)
+        with self.assertNumQueries(0):
+            image = project.main_image
+        return image.name if image else None
+
+    def test_primary_then_oldest_picture(self):
+        self.assertIsNone(self.main_image_name())
+        first = self.add_picture(b'first')
+        self.assertEqual(self.main_image_name(), first.image.name)
+        second = self.add_picture(b'second', is_primary=True)
+        self.assertEqual(self.main_image_name(), second.image.name)
+
+        second.is_primary = False
+        second.save(update_fields=['is_primary'])
+        self.assertEqual(self.main_image_name(), first.image.name)
+
+    def test_deleting_the_picture_falls_back_to_the_next(self):
+        first = self.add_picture(b'first', is_primary=True)
+        second = self.add_picture(b'second')
+        first.delete()
+        self.assertEqual(self.main_image_name(), second.image.name)
+        ProjectPicture.objects.all().delete()
+        self.assertIsNone(self.main_image_name())
+
+    def test_editing_the_project_keeps_the_pointer(self):
+        stale = Project.objects.get(pk=self.project.pk)
+        picture = self.add_picture(b'first')
+        stale.title = 'Solar Pumps II'
+        stale.save()
+        self.assertEqual(self.main_image_name(), picture.image.name)
+
+
+class StatusTransitionTests(TestCase):
+    """Projects change status at their boundaries, checked against a cached next boundary"""
+
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.start = self.now + timedelta(hours=1)
+        self.end = self.now + timedelta(hours=2)
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='-', category='environment', status='coming_soon',
+            target_amount=Decimal('100.00'), creator=creator, start_date=self.start, end_date=self.end,
+        )
+
+    def status(self):
+        self.project.refresh_from_db()
+        return self.project.status
+
+    def test_statuses_change_at_each_boundary(self):
+        second = timedelta(seconds=1)
+        for at, result, status in (
+            (self.start - second, (0, 0), 'coming_soon'),
+            (self.start, (1, 0), 'active'),
+            (self.end - second, (0, 0), 'active'),
+            (self.end, (0, 1), 'completed'),
+        ):
+            self.assertEqual(transitions.apply_transitions(at), result)
+            self.assertEqual(self.status(), status)
+
+    def test_nothing_is_written_before_the_cached_boundary(self):
+        self.assertEqual(transitions.run_due_transitions(self.now), (0, 0))
+        with self.assertNumQueries(0):
+            self.assertEqual(transitions.run_due_transitions(self.start - timedelta(seconds=1)), (0, 0))
+        self.assertEqual(transitions.run_due_transitions(self.start), (1, 0))
+        # The next boundary is the end date now
+        self.assertEqual(transitions.get_cached_next_transition(), self.end)
+        self.assertEqual(transitions.run_due_transitions(self.end), (0, 1))
+        self.assertIsNone(transitions.get_cached_next_transition())
+
+    def test_saving_a_project_invalidates_the_boundary(self):
+        self.assertEqual(transitions.get_cached_next_transition(), self.start)
+        self.project.start_date = self.now - timedelta(minutes=1)
+        self.project.save()
+        self.assertEqual(transitions.run_due_transitions(self.now), (1, 0))
+        self.assertEqual(self.status(), 'active')
+
+    def test_invalidation_wakes_the_ticker(self):
+        ticker = mock.Mock()
+        with mock.patch('pages.transitions._ticker', ticker):
+            transitions.invalidate_next_transition()
+        ticker.wake.assert_called_once_with()
+        self.assertIsNone(cache.get(transitions.NEXT_TRANSITION_CACHE_KEY))
+
+    def test_command(self):
+        stdout = StringIO()
+        call_command('transition_project_statuses', stdout=stdout)
+        self.assertIn('Activated 0 projects and completed 0 projects', stdout.getvalue())
+
+        Project.objects.filter(pk=self.project.pk).update(start_date=self.now - timedelta(minutes=1))
+        # The cached boundary hides the change made without save()...
+        call_command('transition_project_statuses', stdout=StringIO())
+        self.assertEqual(self.status(), 'coming_soon')
+        # ...until --force applies the transitions regardless
+        stdout = StringIO()
+        call_command('transition_project_statuses', force=True, stdout=stdout)
+        self.assertIn('Activated 1 projects and completed 0 projects', stdout.getvalue())
+        self.assertEqual(self.status(), 'active')
+
+    def test_command_loop_applies_due_transitions(self):
+        Project.objects.filter(pk=self.project.pk).update(start_date=self.now - timedelta(minutes=1))
+        # Stop after the first pass, as Ctrl+C would
+        with mock.patch('threading.Event.wait', side_effect=KeyboardInterrupt), \
+                mock.patch('django.db.close_old_connections'):
+            call_command('transition_project_statuses', loop=True, stdout=StringIO())
+        self.assertEqual(self.status(), 'active')
+
+
+class FullTextSearchTests(TestCase):
+    """Matches are filtered and ranked by bm25 with a single MATCH"""
+
+    def setUp(self):
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        for title, description in (
+            ('Solar water', 'Pumps for solar farms'),
+            ('Water wells', 'Deep wells'),
+            ('Choir', 'Singing'),
+        ):
+            Project.objects.create(
+                title=title, description=description, category='environment',
+                target_amount=Decimal('100.00'), creator=creator,
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+            )
+
+    def test_matches_are_ranked_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            ranked = [project.title for project in search_projects(Project.objects.all(), 'solar').order_by('search_rank')]
+        self.assertEqual(ranked, ['Solar water'])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(ctx.captured_queries[0]['sql'].count(' MATCH '), 1)
+        self.assertEqual(search_projects(Project.objects.all(), 'water').count(), 2)
+
+    def test_failed_availability_check_is_retried(self):
+        self.addCleanup(setattr, project_search, '_available', True)
+        project_search._available = False
+        project_search._checked_at = time.monotonic()
+        self.assertFalse(project_search.is_available())
+        project_search._checked_at -= project_search.AVAILABILITY_RECHECK_SECONDS + 1
+        self.assertTrue(project_search.is_available())
+
+
+class FuzzySearchTests(TestCase):
+    """Typo-tolerant lookup scores projects by their title or best matching tag"""
+
+    def setUp(self):
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.projects = {}
+        for title, tags in (('Water pumps', ['solar', 'solaris']), ('Village school', ['solarium']), ('Choir', [])):
+            project = Project.objects.create(
+                title=title, description='-', category='environment',
+                target_amount=Decimal('100.00'), creator=creator,
+                start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+            )
+            project.tags.add(*Tag.get_or_create_many(tags))
+            self.projects[title] = project
+
+    def test_tag_matches_are_read_in_one_query(self):
+        # Trigrams of the projects, of the tags, then the projects of every matching tag
+        with self.assertNumQueries(3):
+            results = fuzzy_search_projects(Project.objects.all(), 'solr')
+        ranked = [project.title for project in results.order_by('search_rank')]
+        self.assertEqual(ranked, ['Water pumps', 'Village school'])
+
+    def test_ranked_ids_are_reused(self):
+        with self.assertNumQueries(3):
+            ranked_ids = fuzzy_ranked_ids('solr')
+        # Filtering more querysets by the same search scores nothing again
+        with self.assertNumQueries(2):
+            listing = fuzzy_search_projects(Project.objects.all(), 'solr', ranked_ids)
+            self.assertEqual([project.pk for project in listing.order_by('search_rank')], ranked_ids)
+            environment = Project.objects.filter(category='environment')
+            self.assertEqual(fuzzy_search_projects(environment, 'solr', ranked_ids).count(), 2)
+        with self.assertNumQueries(0):
+            fuzzy_search_projects(Project.objects.all(), 'solr', [])
+
+
+class FacetTests(TestCase):
+    """Facet counts leave out their own filter, are cached and follow project writes"""
+
+    def setUp(self):
+        cache.clear()
+        self.creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        for title, category, tags in (
+            ('Solar pumps', 'environment', ['solar']),
+            ('Solar lamps', 'environment', ['solar', 'lighting']),
+            ('Clinic', 'health', ['medicine']),
+        ):
+            self.create_project(title, category).tags.add(*Tag.get_or_create_many(tags))
+
+    def create_project(self, title, category):
+        return Project.objects.create(
+            title=title, description='-', category=category,
+            target_amount=Decimal('100.00'), creator=self.creator,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def facets(self, **filters):
+        category_facets, status_facets, tag_facets = project_facets(filters)
+        return (
+            {value: count for value, label, count in category_facets if count},
+            {value: count for value, label, count in status_facets if count},
+            {tag['name']: tag['project_count'] for tag in tag_facets},
+        )
+
+    def test_counts_skip_their_own_dimension(self):
+        categories, statuses, tags = self.facets(category='health')
+        # Picking a category still counts the others...
+        self.assertEqual(categories, {'environment': 2, 'health': 1})
+        # ...while the other dimensions only count that category
+        self.assertEqual(statuses, {'active': 1})
+        self.assertEqual(tags, {'medicine': 1})
+
+    def test_counts_are_cached(self):
+        self.facets(category='health')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.facets(category='health')[0], {'environment': 2, 'health': 1})
+
+    def test_project_writes_invalidate_the_counts(self):
+        self.assertEqual(self.facets()[0], {'environment': 2, 'health': 1})
+        project = self.create_project('Gym', 'health')
+        self.assertEqual(self.facets()[0], {'environment': 2, 'health': 2})
+        project.tags.add(*Tag.get_or_create_many(['medicine']))
+        self.assertEqual(self.facets()[2]['medicine'], 2)
+        project.delete()
+        self.assertEqual(self.facets()[0], {'environment': 2, 'health': 1})
+
+    def test_fuzzy_match_is_scored_once_per_request(self):
+        params = {'search': 'solr', 'fuzzy': '1'}
+        self.client.get(reverse('project_list'))  # token cleanup runs on the first request
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('project_list'), params)
+        trigram_queries = [query for query in queries if 'pages_searchtrigram' in query['sql']]
+        # Projects then tags, shared by the listing and the three facet counts
+        self.assertEqual(len(trigram_queries), 2)
+        counts = {value: count for value, label, count in response.context['category_facets'] if count}
+        self.assertEqual(counts, {'environment': 2})
+        # Cached facets don't score the search at all; the listing scores it once
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('project_list'), params)
+        self.assertEqual(len([query for query in queries if 'pages_searchtrigram' in query['sql']]), 2)
+
+
+class TagAutocompleteTests(TestCase):
+    """Suggestions carry the tag id and stored name, and follow renames"""
+
+    def setUp(self):
+        # The trie outlives the test transactions, so start from the database
+        autocomplete._trie = None
+        self.addCleanup(setattr, autocomplete, '_trie', None)
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.health = Tag.objects.create(name='Health')
+        self.housing = Tag.objects.create(name='housing')
+        project = Project.objects.create(
+            title='Clinic', description='-', category='health',
+            target_amount=Decimal('100.00'), creator=creator,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+        project.tags.add(self.health)
+
+    def suggestions(self, prefix):
+        response = self.client.get(reverse('tag_autocomplete'), {'q': prefix})
+        return response.json()['results']
+
+    def test_results_carry_id_and_original_name(self):
+        self.assertEqual(self.suggestions('h'), [
+            {'id': self.health.pk, 'name': 'Health', 'project_count': 1},
+            {'id': self.housing.pk, 'name': 'housing', 'project_count': 0},
+        ])
+
+    def test_rename_moves_the_tag(self):
+        self.suggestions('h')  # build the trie
+        self.health.name = 'Medicine'
+        self.health.save()
+        self.assertEqual([tag['id'] for tag in self.suggestions('h')], [self.housing.pk])
+        self.assertEqual(self.suggestions('med'), [{'id': self.health.pk, 'name': 'Medicine', 'project_count': 1}])
+
+
+class MediaReferenceTests(TestCase):
+    """Identical uploads share one file, counted by MediaBlob and collected once unused"""
+
+    def setUp(self):
+        cache.clear()
+        self.media_root = use_temporary_media(self)
+        self.creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=self.creator,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def ref_count(self, name):
+        return MediaBlob.objects.get(name=name).ref_count
+
+    def collect(self, **options):
+        call_command('collect_media', stdout=StringIO(), **options)
+
+    def test_identical_uploads_share_one_file(self):
+        first = ProjectPicture.objects.create(project=self.project, image=jpeg_upload('a.jpg'))
+        second = ProjectPicture.objects.create(project=self.project, image=jpeg_upload('b.jpg'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertEqual(ContentAddressedStorage.digest(first.image.name), MediaBlob.objects.get().sha256)
+        self.assertEqual(self.ref_count(first.image.name), 2)
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))), 1)
+
+    def test_references_follow_replacements_and_deletes(self):
+        picture = ProjectPicture.objects.create(project=self.project, image=jpeg_upload(color='red'))
+        old_name = picture.image.name
+        picture.image = jpeg_upload(color='blue')
+        picture.save()
+        self.assertEqual(self.ref_count(old_name), 0)
+        self.assertEqual(self.ref_count(picture.image.name), 1)
+        picture.delete()
+        self.assertEqual(self.ref_count(picture.image.name), 0)
+
+    def test_pictures_of_a_new_project_are_counted(self):
+        images = [jpeg_upload(color='red'), jpeg_upload(color='blue')]
+        pictures = ProjectPicture.add_to_new_project(self.project, images)
+        self.assertEqual([self.ref_count(picture.image.name) for picture in pictures], [1, 1])
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.primary_picture, pictures[0])
+
+    def test_collect_media_deletes_only_old_unreferenced_files(self):
+        kept = ProjectPicture.objects.create(project=self.project, image=jpeg_upload(color='red'))
+        released = ProjectPicture.objects.create(project=self.project, image=jpeg_upload(color='blue'))
+        released.delete()
+        fresh = ProjectPicture.objects.create(project=self.project, image=jpeg_upload(color='green'))
+        fresh.delete()
+        MediaBlob.objects.exclude(name=fresh.image.name).update(touched_at=timezone.now() - timedelta(days=2))
+
+        self.collect(dry_run=True)
+        self.assertTrue(os.path.exists(released.image.path))
+        self.collect()
+        self.assertFalse(os.path.exists(released.image.path))
+        self.assertFalse(MediaBlob.objects.filter(name=released.image.name).exists())
+        # Still referenced, or within the grace period
+        self.assertTrue(os.path.exists(kept.image.path))
+        self.assertTrue(os.path.exists(fresh.image.path))
+
+    def test_recount_repairs_drifted_counts(self):
+        picture = ProjectPicture.objects.create(project=self.project, image=jpeg_upload())
+        MediaBlob.objects.update(ref_count=0, touched_at=timezone.now() - timedelta(days=2))
+        self.collect(recount=True)
+        self.assertEqual(self.ref_count(picture.image.name), 1)
+        self.assertTrue(os.path.exists(picture.image.path))
+
+    def test_collected_files_take_their_renditions_along(self):
+        picture = ProjectPicture.objects.create(project=self.project, image=jpeg_upload())
+        render_variants(picture.image, ['card'])
+        name, digest = picture.image.name, MediaBlob.objects.get().sha256
+        variants_dir = os.path.join(self.media_root, 'variants', digest[:2], digest)
+        self.assertTrue(os.listdir(variants_dir))
+        picture.delete()
+        MediaBlob.objects.update(touched_at=timezone.now() - timedelta(days=2))
+
+        self.collect()
+        self.assertEqual(os.listdir(variants_dir), [])
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, manifest_name(name))))
+        self.assertEqual(read_manifest(name), {})
+
+    def test_backfill_moves_files_uploaded_before_content_addressing(self):
+        # Two rows with identical files under their original upload names
+        for filename in ('old.jpg', 'copy.jpg'):
+            path = os.path.join(self.media_root, 'project_pictures', filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as legacy:
+                legacy.write(jpeg_upload().read())
+        pictures = [
+            ProjectPicture.objects.create(project=self.project, image=jpeg_upload(color='red'))
+            for _ in range(2)
+        ]
+        ProjectPicture.objects.filter(pk=pictures[0].pk).update(image='project_pictures/old.jpg')
+        ProjectPicture.objects.filter(pk=pictures[1].pk).update(image='project_pictures/copy.jpg')
+        MediaBlob.objects.all().delete()
+        pictures[0].refresh_from_db()
+        render_variants(pictures[0].image, ['card'])
+
+        self.collect(backfill=True, dry_run=True)
+        self.assertFalse(MediaBlob.objects.exists())
+        self.collect(backfill=True)
+
+        names = set(ProjectPicture.objects.values_list('image', flat=True))
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(ContentAddressedStorage.digest(name))
+        self.assertEqual(self.ref_count(name), 2)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'project_pictures', 'old.jpg')))
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'project_pictures', 'copy.jpg')))
+        # The renditions rendered for the old name still serve the new one
+        self.assertEqual(read_manifest(name)['variants'], {'card': [60]})
+
+
+class ImageProcessingTests(TestCase):
+    """Uploads are normalized by process_images, and no row stays claimed forever"""
+
+    def setUp(self):
+        cache.clear()
+        use_temporary_media(self)
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotate 90 degrees
+        exif[0x010f] = 'PhoneMaker'
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=creator, image=jpeg_upload(exif=exif),
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def process(self, **options):
+        call_command('process_images', stdout=StringIO(), **options)
+
+    def add_picture(self, **kwargs):
+        return ProjectPicture.objects.create(project=self.project, image=jpeg_upload(), **kwargs)
+
+    def test_main_image_is_normalized(self):
+        self.assertEqual(self.project.processing_status, 'pending')
+        self.process()
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.processing_status, 'ready')
+        with self.project.image.open('rb') as stored:
+            image = Image.open(stored)
+            self.assertEqual(image.size, (40, 60))
+            self.assertEqual(dict(image.getexif()), {})
+
+    def test_unexpected_errors_mark_the_upload_failed(self):
+        picture = self.add_picture()
+        with mock.patch('pages.images.normalize_upload', side_effect=ValueError('broken')), \
+                self.assertLogs('pages.images', 'WARNING'):
+            self.assertTrue(process_upload(picture))
+        picture.refresh_from_db()
+        self.assertEqual((picture.processing_status, picture.processing_error), ('failed', 'broken'))
+
+        self.process(retry_failed=True)
+        picture.refresh_from_db()
+        self.assertEqual(picture.processing_status, 'ready')
+
+    def test_abandoned_claims_are_requeued(self):
+        abandoned = self.add_picture(
+            processing_status='processing', processing_started_at=timezone.now() - timedelta(hours=2),
+        )
+        running = self.add_picture(processing_status='processing', processing_started_at=timezone.now())
+        self.process()
+        abandoned.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(abandoned.processing_status, 'ready')
+        self.assertEqual(running.processing_status, 'processing')
+
+    def test_profile_pictures_are_rendered_by_the_command(self):
+        user = CustomUser.objects.create_user(
+            email='dana@example.com', password='x', first_name='Dana', last_name='Donor',
+            mobile_phone='01012345678', is_active=True,
+        )
+        session = self.client.session
+        session['user_user_id'] = str(user.id)
+        session.save()
+        data = {'email': user.email, 'first_name': 'Dana', 'last_name': 'Donor', 'mobile_phone': '01012345678'}
+
+        # The upload request only queues the picture...
+        response = self.client.post(
+            reverse('edit_profile'), dict(data, profile_picture=jpeg_upload(size=(400, 400))),
+        )
+        self.assertRedirects(response, reverse('profile'), fetch_redirect_response=False)
+        user.refresh_from_db()
+        self.assertTrue(user.profile_picture_pending)
+        self.assertEqual(read_manifest(user.profile_picture.name), {})
+
+        # ...the command renders its avatars
+        self.process()
+        user.refresh_from_db()
+        self.assertFalse(user.profile_picture_pending)
+        self.assertEqual(read_manifest(user.profile_picture.name)['variants'], {'avatar': [64, 160, 320]})
+
+        # Edits that keep the picture queue nothing
+        self.client.post(reverse('edit_profile'), dict(data, first_name='Dina'))
+        user.refresh_from_db()
+        self.assertFalse(user.profile_picture_pending)
+
+
+class ImageVariantTests(TestCase):
+    """Templates list the renditions that exist and never render any themselves"""
+
+    def setUp(self):
+        self.media_root = use_temporary_media(self)
+        cache.clear()
+        creator = CustomUser.objects.create_user(
+            email='creator@example.com', password='x', first_name='C', last_name='R', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=creator, image=jpeg_upload(size=(500, 300)),
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def render(self):
+        template = Template("{% load image_variants %}{% responsive_image project.image 'card' alt='Pumps' %}")
+        return template.render(Context({'project': self.project}))
+
+    def test_variant_name(self):
+        digest = 'ab' * 32
+        self.assertEqual(variant_name(digest, 'card', 320, 'webp'), f'variants/ab/{digest}/card-320.webp')
+
+    def test_unprocessed_image_falls_back_to_the_original(self):
+        html = self.render()
+        self.assertIn(f'<img src="{self.project.image.url}"', html)
+        self.assertNotIn('srcset', html)
+        self.assertFalse(os.path.exists(os.path.join(self.media_root, 'variants')))
+
+    def test_rendered_variants_are_listed(self):
+        # Never wider than the original
+        self.assertEqual(render_variants(self.project.image, ['card']), {'card': [320, 500]})
+        cache.clear()
+
+        html = self.render()
+        self.assertIn('<source type="image/webp"', html)
+        digest = ContentAddressedStorage.digest(self.project.image.name)
+        for width in (320, 500):
+            for fmt in ('webp', 'jpeg'):
+                name = variant_name(digest, 'card', width, fmt)
+                self.assertIn(f'/media/{name} {width}w', html)
+                self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+
+
+class CommentReportLookupTests(TestCase):
+    """The detail page looks up comment reports for the whole thread at once"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='reader@example.com', password='x', first_name='R', last_name='D', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=self.user,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+        session = self.client.session
+        session['user_user_id'] = str(self.user.id)
+        session.save()
+
+    def add_comments(self, count):
+        author = CustomUser.objects.create_user(
+            email=f'author{Comment.objects.count()}@example.com', password='x',
+            first_name='A', last_name='U', is_active=True,
+        )
+        for _ in range(count):
+            comment = Comment.objects.create(user=author, project=self.project, content='Great idea')
+            reply = Comment.objects.create(user=author, project=self.project, content='Thanks', parent=comment)
+            ReportedComment.objects.create(user=self.user, comment=reply, reason='Spam')
+        return comment
+
+    def detail_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('project_detail', args=[self.project.id]), {'show_comments': 'all'})
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_the_thread(self):
+        comment = self.add_comments(2)
+        ReportedComment.objects.create(user=self.user, comment=comment, reason='Spam')
+        # The first request also runs the periodic token cleanup
+        self.detail_queries()
+        response, queries = self.detail_queries()
+
+        thread = {data['comment'].id: data for data in response.context['comments_with_reports']}
+        self.assertTrue(thread[comment.id]['user_reported'])
+        self.assertEqual(thread[comment.id]['report_count'], 1)
+
+        self.add_comments(8)
+        self.assertEqual(self.detail_queries()[1], queries)
+
+    def test_replies_carry_the_users_reports(self):
+        comment = self.add_comments(1)
+        response = self.client.get(reverse('comment_replies', args=[comment.id]))
+        [reply] = response.json()['results']
+        self.assertTrue(reply['user_reported'])
+        self.assertFalse(reply['can_report'])
+        self.assertEqual(reply['report_count'], 1)
+
+
+class CommentThreadTests(TestCase):
+    """Threads keep a materialized path and reply count, and load a page at a time"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='author@example.com', password='x', first_name='A', last_name='U', is_active=True,
+        )
+        self.project = Project.objects.create(
+            title='Solar Pumps', description='Water for farms', category='environment',
+            target_amount=Decimal('100.00'), creator=self.user,
+            start_date=timezone.now() - timedelta(days=1), end_date=timezone.now() + timedelta(days=30),
+        )
+
+    def comment(self, parent=None):
+        return Comment.objects.create(user=self.user, project=self.project, content='Hi', parent=parent)
+
+    def test_path_and_reply_count(self):
+        root = self.comment()
+        reply = self.comment(root)
+        nested = self.comment(reply)
+        other = self.comment()
+        self.comment(other)
+
+        root.refresh_from_db()
+        self.assertEqual(root.reply_count, 1)
+        self.assertEqual((root.depth, reply.depth, nested.depth), (0, 1, 2))
+        self.assertTrue(nested.path.startswith(reply.path))
+        with self.assertNumQueries(1):
+            self.assertEqual(list(root.subthread()), [reply, nested])
+
+        nested.delete()
+        reply.refresh_from_db()
+        self.assertEqual(reply.reply_count, 0)
+
+    def test_replies_endpoint_pages_through_the_subthread(self):
+        root = self.comment()
+        replies = [self.comment(root) for _ in range(3)]
+        nested = self.comment(replies[0])
+        url = reverse('comment_replies', args=[root.id])
+
+        with mock.patch('pages.views.REPLIES_PER_PAGE', 2):
+            first = self.client.get(url).json()
+            second = self.client.get(url, {'after': first['next']}).json()
+        self.assertEqual(
+            [reply['id'] for reply in first['results'] + second['results']],
+            [replies[0].id, nested.id, replies[1].id, replies[2].id],
+        )
+        self.assertEqual([reply['depth'] for reply in first['results']], [1, 2])
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.client.get(url, {'after': 'bogus'}).status_code, 400)
+
+    def test_replies_list_the_rendered_avatar_renditions(self):
+        use_temporary_media(self)
+        self.user.profile_picture = jpeg_upload(size=(400, 400))
+        self.user.save()
+        root = self.comment()
+        self.comment(root)
+        url = reverse('comment_replies', args=[root.id])
+
+        picture = self.client.get(url).json()['results'][0]['user']
+        self.assertEqual((picture['picture_url'], picture['picture_srcset']), (self.user.profile_picture.url, ''))
+
+        render_variants(self.user.profile_picture, ['avatar'])
+        picture = self.client.get(url).json()['results'][0]['user']
+        self.assertIn('/variants/', picture['picture_url'])
+        self.assertIn(' 64w', picture['picture_srcset'])
+
+    def test_replies_stop_at_max_depth(self):
+        session = self.client.session
+        session['user_user_id'] = str(self.user.id)
+        session.save()
+        comment = self.comment()
+        while comment.depth < Comment.MAX_DEPTH:
+            comment = self.comment(comment)
+        self.assertLessEqual(len(comment.path), Comment._meta.get_field('path').max_length)
+
+        url = reverse('project_detail', args=[self.project.id])
+        for parent in (comment, comment.parent):
+            self.client.post(url, {'form_type': 'comment', 'content': 'Deeper', 'parent_id': parent.id})
+        deeper = Comment.objects.filter(content='Deeper').values_list('parent_id', flat=True)
+        self.assertEqual(list(deeper), [comment.parent_id])
+
+    def test_detail_page_shows_one_page_of_comments(self):
+        comments = [self.comment() for _ in range(12)]
+        url = reverse('project_detail', args=[self.project.id])
+        with mock.patch('pages.views.COMMENTS_PER_PAGE', 5):
+            response = self.client.get(url)
+            page = response.context['comments_page']
+            self.assertEqual([c.id for c in page], [c.id for c in comments[::-1][:5]])
+            response = self.client.get(url, {'comments_after': page.next_cursor})
+        self.assertEqual([c.id for c in response.context['comments_page']], [c.id for c in comments[::-1][5:10]])
+        self.assertEqual(response.context['all_comments_count'], 12)
+
+
+@override_settings(SIGNED_ACCOUNT_TOKENS=True)
+class SignedAccountTokenTests(TestCase):
+    """Signed links work once, expire, and never touch the token tables"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='signed@example.com', password='old-pass-123', first_name='S', last_name='T',
+        )
+
+    def test_activation_link_works_once(self):
+        token = TokenService.issue_activation_token(self.user)
+        self.assertFalse(ActivationToken.objects.exists())
+
+        response = self.client.get(reverse('activate', kwargs={'token': token}))
+        self.assertRedirects(response, reverse('login'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_active)
+
+        # Activating changed the account state the token was bound to
+        self.assertEqual(TokenService.validate_activation_token(token)[0], None)
+
+    def test_reset_token_is_void_after_password_change(self):
+        token = TokenService.issue_password_reset_token(self.user)
+        self.assertEqual(TokenService.validate_password_reset_token(token), (self.user, None))
+        self.user.set_password('new-pass-456')
+        self.user.save()
+        self.assertEqual(TokenService.validate_password_reset_token(token)[0], None)
+
+    def test_reset_token_expires(self):
+        token = TokenService.issue_password_reset_token(self.user)
+        later = time.time() + PasswordResetToken.LIFETIME.total_seconds() + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            user, error = TokenService.validate_password_reset_token(token)
+        self.assertIsNone(user)
+        self.assertIn('expired', error)
+
+    def test_activation_link_expires(self):
+        token = TokenService.issue_activation_token(self.user)
+        later = time.time() + ActivationToken.LIFETIME.total_seconds() + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertEqual(
+                TokenService.validate_activation_token(token),
+                (None, 'Activation link has expired. Please register again.'),
+            )
+
+    def test_tampered_tokens_are_rejected(self):
+        token = TokenService.issue_password_reset_token(self.user)
+        other = CustomUser.objects.create_user(
+            email='other@example.com', password='x', first_name='O', last_name='T',
+        )
+        payload, signature = token.split(':', 1)
+        other_payload = signing.dumps({'u': other.pk, 'f': 'x' * 20}, salt=PASSWORD_RESET_SALT).split(':', 1)[0]
+        for forged in (
+            # Another signature, or another user's payload under this one
+            token[:-1] + {'A': 'B'}.get(token[-1], 'A'),
+            f'{other_payload}:{signature}',
+            # Signed for the other purpose
+            TokenService.issue_activation_token(self.user),
+            'not-a-token',
+        ):
+            with self.subTest(forged):
+                self.assertEqual(
+                    TokenService.validate_password_reset_token(forged), (None, 'Invalid password reset link.'),
+                )
+
+    def test_tampered_activation_link_is_refused(self):
+        token = TokenService.issue_activation_token(self.user)
+        response = self.client.get(reverse('activate', kwargs={'token': token[:-2] + 'xx'}))
+        self.assertRedirects(response, reverse('register'), fetch_redirect_response=False)
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+
+
+class TokenCleanupTests(TestCase):
+    """Expired tokens are purged at most once per interval, or on demand"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email='token@example.com', password='x', first_name='T', last_name='K',
+        )
+        self.addCleanup(setattr, TokenMiddleware, '_next_cleanup', TokenMiddleware._next_cleanup)
+        TokenMiddleware._next_cleanup = 0
+
+    def cleanup_at(self, seconds, **kwargs):
+        with mock.patch('pages.tokens.time.monotonic', return_value=seconds), \
+                mock.patch.object(TokenService, 'cleanup_expired_tokens', **kwargs) as cleanup:
+            TokenMiddleware.maybe_cleanup()
+        return cleanup.call_count
+
+    def test_middleware_cleans_up_once_per_interval(self):
+        interval = TokenMiddleware.CLEANUP_INTERVAL
+        self.assertEqual(self.cleanup_at(1000), 1)
+        self.assertEqual(self.cleanup_at(1000 + interval - 1), 0)
+        self.assertEqual(self.cleanup_at(1000 + interval), 1)
+
+    def test_failed_cleanup_waits_for_the_next_interval(self):
+        with self.assertLogs('pages.tokens', 'ERROR'):
+            self.assertEqual(self.cleanup_at(1000, side_effect=DatabaseError), 1)
+        self.assertEqual(self.cleanup_at(1001), 0)
+        self.assertEqual(self.cleanup_at(1000 + TokenMiddleware.CLEANUP_INTERVAL), 1)
+
+    def test_command_deletes_expired_tokens(self):
+        expired = ActivationToken.objects.create(user=self.user)
+        ActivationToken.objects.filter(pk=expired.pk).update(
+            created_at=timezone.now() - ActivationToken.LIFETIME - timedelta(minutes=1)
+        )
+        fresh = PasswordResetToken.objects.create(user=self.user)
+
+        stdout = StringIO()
+        call_command('cleanup_tokens', stdout=stdout)
+        self.assertIn('1 expired activation tokens and 0 expired password reset tokens', stdout.getvalue())
+        self.assertEqual(list(PasswordResetToken.objects.all()), [fresh])
+
+        call_command('cleanup_tokens', all=True, stdout=StringIO())
+        self.assertFalse(PasswordResetToken.objects.exists())
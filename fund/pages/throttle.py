@@ -0,0 +1,130 @@
+"""
+Token-bucket throttling for the login and password reset endpoints.
+
+Every attempt takes one token from each of three buckets: the client IP's,
+the targeted email's from that IP, and the targeted email's across all IPs.
+The first slows down one client trying many accounts, the second one client
+guessing one password, and the third the same guessing spread over many
+addresses (credential stuffing). The account-wide bucket is larger, so a
+stranger locks the owner out only for as long as they keep hammering it. A
+bucket holds `capacity` tokens and refills completely over `period` seconds,
+so short bursts pass but sustained guessing is slowed down to the refill
+rate. The check runs before the form is validated, i.e. before any password
+hashing or email is sent.
+
+Refused attempts are counted per scope and bucket kind (throttle_counts()).
+
+Buckets live in the Django cache so all processes share them; if the cache
+is unreachable a per-process copy is used instead. Buckets are read and
+written without a lock, so concurrent attempts may occasionally get one
+token too many, which is fine for this purpose.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# scope -> {key kind: (capacity, period in seconds)}
+THROTTLE_RATES = {
+    'login': {'ip': (20, 300), 'email_ip': (5, 300), 'email': (30, 300)},
+    'admin_login': {'ip': (10, 300), 'email_ip': (5, 300), 'email': (20, 300)},
+    'password_reset': {'ip': (5, 900), 'email_ip': (3, 900), 'email': (5, 900)},
+}
+
+COUNTER_CACHE_KEY = 'pages:throttle:throttled:{scope}:{kind}'
+
+_local_buckets = {}
+_local_counts = Counter()
+_local_lock = threading.Lock()
+
+
+def client_ip(request):
+    return request.META.get('REMOTE_ADDR') or 'unknown'
+
+
+def _bucket_key(scope, kind, value):
+    digest = hashlib.sha1(value.encode()).hexdigest()
+    return f'pages:throttle:{scope}:{kind}:{digest}'
+
+
+def _load(keys):
+    try:
+        return cache.get_many(keys)
+    except Exception:
+        logger.warning('Throttle cache unavailable, using in-process buckets', exc_info=True)
+        with _local_lock:
+            return {key: _local_buckets[key] for key in keys if key in _local_buckets}
+
+
+def _store(buckets, timeout):
+    try:
+        cache.set_many(buckets, timeout)
+    except Exception:
+        with _local_lock:
+            _local_buckets.update(buckets)
+
+
+def _count_throttled(scope, kinds):
+    for kind in kinds:
+        key = COUNTER_CACHE_KEY.format(scope=scope, kind=kind)
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key)
+        except Exception:
+            with _local_lock:
+                _local_counts[key] += 1
+
+
+def throttle_counts():
+    """{(scope, kind): refused attempts}, across processes when the cache is up"""
+    keys = {
+        (scope, kind): COUNTER_CACHE_KEY.format(scope=scope, kind=kind)
+        for scope, rates in THROTTLE_RATES.items() for kind in rates
+    }
+    try:
+        shared = cache.get_many(list(keys.values()))
+    except Exception:
+        shared = {}
+    with _local_lock:
+        return {name: shared.get(key, 0) + _local_counts[key] for name, key in keys.items()}
+
+
+def is_throttled(request, scope, email=None):
+    """
+    Take a token from the IP bucket (and the email buckets, if given) for
+    `scope`. Returns True, without taking anything, when one of them is empty.
+    """
+    rates = THROTTLE_RATES[scope]
+    ip = client_ip(request)
+    targets = {'ip': ip}
+    if email:
+        email = email.strip().lower()
+        targets['email_ip'] = f'{email}|{ip}'
+        targets['email'] = email
+
+    keys = {kind: _bucket_key(scope, kind, value) for kind, value in targets.items()}
+    stored = _load(list(keys.values()))
+    now = time.time()
+
+    buckets = {}
+    for kind, key in keys.items():
+        capacity, period = rates[kind]
+        tokens, updated_at = stored.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated_at) * capacity / period)
+        buckets[key] = (tokens, now)
+
+    throttled = [kind for kind, key in keys.items() if buckets[key][0] < 1]
+    if throttled:
+        _count_throttled(scope, throttled)
+        logger.warning('Throttled %s attempt (%s limit) from %s', scope, '/'.join(throttled), ip)
+        return True
+
+    buckets = {key: (tokens - 1, now) for key, (tokens, now) in buckets.items()}
+    # An untouched bucket is full again after `period`, same as a missing one
+    _store(buckets, max(period for _, period in rates.values()))
+    return False
@@ -1,11 +1,20 @@
+import logging
+import threading
+import time
 import uuid
 from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.db import DatabaseError, transaction
 from django.utils import timezone
-from django.core.mail import send_mail
+from django.utils.crypto import constant_time_compare, salted_hmac
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.conf import settings
-from .models import CustomUser, ActivationToken, PasswordResetToken
+from .models import CustomUser, ActivationToken, OutboundEmail, PasswordResetToken
+
+logger = logging.getLogger(__name__)
+
+ACTIVATION_SALT = 'pages.tokens.activation'
+PASSWORD_RESET_SALT = 'pages.tokens.password_reset'
 
 
 class TokenService:
@@ -31,11 +40,60 @@ class TokenService:
         token = PasswordResetToken.objects.create(user=user)
         return token
     
+    @staticmethod
+    def _fingerprint(user):
+        """
+        Digest of the user state a signed token is bound to. Activating the
+        account or changing the password changes it, so each token works once.
+        """
+        state = f'{user.pk}:{user.password}:{user.last_login}:{user.is_active}'
+        return salted_hmac('pages.tokens.fingerprint', state).hexdigest()[:20]
+    
+    @staticmethod
+    def _make_signed_token(user, salt):
+        return signing.dumps({'u': user.pk, 'f': TokenService._fingerprint(user)}, salt=salt)
+    
+    @staticmethod
+    def _check_signed_token(token_value, salt, lifetime):
+        """Return (user, None), or (None, 'expired'/'invalid')"""
+        try:
+            payload = signing.loads(str(token_value), salt=salt, max_age=lifetime)
+        except signing.SignatureExpired:
+            return None, 'expired'
+        except signing.BadSignature:
+            return None, 'invalid'
+        user = CustomUser.objects.filter(pk=payload.get('u')).first()
+        if user is None or not constant_time_compare(payload.get('f', ''), TokenService._fingerprint(user)):
+            return None, 'invalid'
+        return user, None
+    
+    @staticmethod
+    def issue_activation_token(user):
+        """The token value to put in the activation link"""
+        if settings.SIGNED_ACCOUNT_TOKENS:
+            return TokenService._make_signed_token(user, ACTIVATION_SALT)
+        return TokenService.generate_activation_token(user).token
+    
+    @staticmethod
+    def issue_password_reset_token(user):
+        """The token value to put in the password reset link"""
+        if settings.SIGNED_ACCOUNT_TOKENS:
+            return TokenService._make_signed_token(user, PASSWORD_RESET_SALT)
+        return TokenService.generate_password_reset_token(user).token
+    
     @staticmethod
     def validate_activation_token(token_value):
         """Validate an activation token and return the user if valid"""
+        if settings.SIGNED_ACCOUNT_TOKENS:
+            user, error = TokenService._check_signed_token(token_value, ACTIVATION_SALT, ActivationToken.LIFETIME)
+            if error == 'expired':
+                return None, "Activation link has expired. Please register again."
+            if error:
+                return None, "Invalid activation link."
+            return user, None
+        
         try:
-            token = ActivationToken.objects.get(token=token_value)
+            token = ActivationToken.objects.get(token=uuid.UUID(str(token_value)))
             
             if token.is_expired():
                 token.delete()
@@ -45,14 +103,24 @@ class TokenService:
             token.delete()  # Delete the used token
             return user, None
             
-        except ActivationToken.DoesNotExist:
+        except (ValueError, ActivationToken.DoesNotExist):
             return None, "Invalid activation link."
     
     @staticmethod
     def validate_password_reset_token(token_value):
         """Validate a password reset token and return the user if valid"""
+        if settings.SIGNED_ACCOUNT_TOKENS:
+            user, error = TokenService._check_signed_token(
+                token_value, PASSWORD_RESET_SALT, PasswordResetToken.LIFETIME
+            )
+            if error == 'expired':
+                return None, "Password reset link has expired. Please request a new one."
+            if error:
+                return None, "Invalid password reset link."
+            return user, None
+        
         try:
-            token = PasswordResetToken.objects.get(token=token_value)
+            token = PasswordResetToken.objects.get(token=uuid.UUID(str(token_value)))
             
             if token.is_expired():
                 token.delete()
@@ -61,69 +129,54 @@ class TokenService:
             user = token.user
             return user, None
             
-        except PasswordResetToken.DoesNotExist:
+        except (ValueError, PasswordResetToken.DoesNotExist):
             return None, "Invalid password reset link."
     
+    @staticmethod
+    def consume_password_reset_token(user):
+        """Invalidate the user's reset link once the password has been changed"""
+        # A signed token is already void: it was bound to the old password hash
+        if not settings.SIGNED_ACCOUNT_TOKENS:
+            PasswordResetToken.objects.filter(user=user).delete()
+    
     @staticmethod
     def send_activation_email(user, request):
-        """Send activation email to user"""
-        token = TokenService.generate_activation_token(user)
-        
-        subject = 'Activate Your Crowd-Funding Account'
-        html_message = render_to_string('auth/activation_email.html', {
-            'user': user,
-            'token': token.token,
-            'domain': request.get_host(),
-            'protocol': 'https' if request.is_secure() else 'http'
-        })
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        """Queue the activation email; `manage.py send_outbox` delivers it"""
+        with transaction.atomic():
+            token = TokenService.issue_activation_token(user)
+            
+            subject = 'Activate Your Crowd-Funding Account'
+            html_message = render_to_string('auth/activation_email.html', {
+                'user': user,
+                'token': token,
+                'domain': request.get_host(),
+                'protocol': 'https' if request.is_secure() else 'http'
+            })
+            OutboundEmail.enqueue(user.email, subject, html_message)
     
     @staticmethod
     def send_password_reset_email(user, request):
-        """Send password reset email to user"""
-        token = TokenService.generate_password_reset_token(user)
-        
-        subject = 'Reset Your Password'
-        html_message = render_to_string('auth/password_reset_email.html', {
-            'user': user,
-            'token': token.token,
-            'domain': request.get_host(),
-            'protocol': 'https' if request.is_secure() else 'http'
-        })
-        plain_message = strip_tags(html_message)
-        
-        send_mail(
-            subject,
-            plain_message,
-            settings.DEFAULT_FROM_EMAIL,
-            [user.email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        """Queue the password reset email; `manage.py send_outbox` delivers it"""
+        with transaction.atomic():
+            token = TokenService.issue_password_reset_token(user)
+            
+            subject = 'Reset Your Password'
+            html_message = render_to_string('auth/password_reset_email.html', {
+                'user': user,
+                'token': token,
+                'domain': request.get_host(),
+                'protocol': 'https' if request.is_secure() else 'http'
+            })
+            OutboundEmail.enqueue(user.email, subject, html_message)
     
     @staticmethod
     def cleanup_expired_tokens():
-        """Clean up expired tokens from the database"""
-        # Delete expired activation tokens
-        activation_tokens = ActivationToken.objects.all()
-        for token in activation_tokens:
-            if token.is_expired():
-                token.delete()
-        
-        # Delete expired password reset tokens
-        password_tokens = PasswordResetToken.objects.all()
-        for token in password_tokens:
-            if token.is_expired():
-                token.delete()
+        """
+        Delete expired tokens with one DELETE per model.
+        Returns (activation tokens deleted, password reset tokens deleted).
+        """
+        now = timezone.now()
+        return ActivationToken.delete_expired(now), PasswordResetToken.delete_expired(now)
     
     @staticmethod
     def delete_user_tokens(user):
@@ -133,70 +186,33 @@ class TokenService:
 
 
 class TokenMiddleware:
-    """Middleware to automatically clean up expired tokens"""
-    
+    """Middleware to periodically clean up expired tokens"""
+
+    # Seconds between cleanups, shared by all requests of the process
+    CLEANUP_INTERVAL = 600
+
+    _next_cleanup = 0
+    _lock = threading.Lock()
+
     def __init__(self, get_response):
         self.get_response = get_response
-        # Clean up tokens once when the server starts
-        TokenService.cleanup_expired_tokens()
-    
+
     def __call__(self, request):
-        # Clean up expired tokens periodically (e.g., every 100 requests)
-        if not hasattr(request, 'cleanup_tokens_counter'):
-            request.cleanup_tokens_counter = 0
-        
-        request.cleanup_tokens_counter += 1
-        
-        if request.cleanup_tokens_counter % 100 == 0:
-            TokenService.cleanup_expired_tokens()
-        
+        self.maybe_cleanup()
         response = self.get_response(request)
         return response
 
-
-# Command to clean up tokens manually
-from django.core.management.base import BaseCommand
-
-class Command(BaseCommand):
-    help = 'Clean up expired activation and password reset tokens'
-    
-    def add_arguments(self, parser):
-        parser.add_argument(
-            '--all',
-            action='store_true',
-            help='Delete all tokens, not just expired ones',
-        )
-    
-    def handle(self, *args, **options):
-        delete_all = options['all']
-        
-        if delete_all:
-            # Delete all tokens
-            ActivationToken.objects.all().delete()
-            PasswordResetToken.objects.all().delete()
-            self.stdout.write(
-                self.style.SUCCESS('Successfully deleted all tokens')
-            )
-        else:
-            # Delete only expired tokens
-            expired_activation_count = 0
-            expired_password_count = 0
-            
-            activation_tokens = ActivationToken.objects.all()
-            for token in activation_tokens:
-                if token.is_expired():
-                    token.delete()
-                    expired_activation_count += 1
-            
-            password_tokens = PasswordResetToken.objects.all()
-            for token in password_tokens:
-                if token.is_expired():
-                    token.delete()
-                    expired_password_count += 1
-            
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f'Successfully cleaned up {expired_activation_count} expired activation tokens '
-                    f'and {expired_password_count} expired password reset tokens'
-                )
-            )
\ No newline at end of file
+    @classmethod
+    def maybe_cleanup(cls):
+        now = time.monotonic()
+        if now < cls._next_cleanup:
+            return
+        with cls._lock:
+            if now < cls._next_cleanup:
+                return
+            cls._next_cleanup = now + cls.CLEANUP_INTERVAL
+        try:
+            TokenService.cleanup_expired_tokens()
+        except DatabaseError:
+            # e.g. tables missing before the first migrate; try again next interval
+            logger.exception('Expired token cleanup failed')
@@ -0,0 +1,145 @@
+"""
+Scheduled project status transitions.
+
+Projects move coming_soon -> active at start_date and active -> completed at
+end_date. Instead of issuing UPDATEs on every page view, the time of the next
+boundary is cached and the database is only written once it has passed.
+Transitions are driven by `manage.py transition_project_statuses` (cron or
+--loop) or by the optional in-process ticker (settings.PROJECT_STATUS_TICKER).
+"""
+import logging
+import threading
+
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Project
+
+logger = logging.getLogger(__name__)
+
+NEXT_TRANSITION_CACHE_KEY = 'pages:project_status:next_transition'
+
+# Cache marker for "no project has an upcoming boundary"
+NO_TRANSITION = 'none'
+
+# Upper bound for how long the boundary is cached and the ticker sleeps, so
+# boundaries written by another process (whose cache we can't see) are
+# still picked up
+TICKER_MAX_SLEEP = 300
+
+
+def next_transition_at():
+    """Return the earliest pending start_date/end_date boundary, or None"""
+    starts = Project.objects.filter(status='coming_soon').aggregate(at=Min('start_date'))['at']
+    ends = Project.objects.filter(status='active').aggregate(at=Min('end_date'))['at']
+    pending = [at for at in (starts, ends) if at is not None]
+    return min(pending) if pending else None
+
+
+def apply_transitions(now=None):
+    """Move every project whose boundary has passed; return (activated, completed)"""
+    now = now or timezone.now()
+
+    # Update projects from 'coming_soon' to 'active' when start_date is reached
+    activated = Project.objects.filter(
+        status='coming_soon',
+        start_date__lte=now
+    ).update(status='active')
+
+    # Update projects from 'active' to 'completed' when end_date is reached
+    completed = Project.objects.filter(
+        status='active',
+        end_date__lte=now
+    ).update(status='completed')
+
+    return activated, completed
+
+
+def get_cached_next_transition():
+    """Return the cached next boundary, computing and caching it on a miss"""
+    cached = cache.get(NEXT_TRANSITION_CACHE_KEY)
+    if cached is None:
+        next_at = next_transition_at()
+        cache.set(NEXT_TRANSITION_CACHE_KEY, next_at or NO_TRANSITION, TICKER_MAX_SLEEP)
+        return next_at
+    return None if cached == NO_TRANSITION else cached
+
+
+def invalidate_next_transition():
+    """Forget the cached boundary (a project's dates or status changed)"""
+    cache.delete(NEXT_TRANSITION_CACHE_KEY)
+    if _ticker is not None:
+        _ticker.wake()
+
+
+def run_due_transitions(now=None):
+    """
+    Apply transitions only if the cached next boundary has passed.
+    Returns (activated, completed); (0, 0) without touching the database
+    when nothing is due.
+    """
+    now = now or timezone.now()
+    next_at = get_cached_next_transition()
+    if next_at is None or next_at > now:
+        return 0, 0
+
+    result = apply_transitions(now)
+    invalidate_next_transition()
+    return result
+
+
+class TransitionTicker(threading.Thread):
+    """Daemon thread that wakes at the next boundary and applies transitions"""
+
+    def __init__(self, max_sleep=TICKER_MAX_SLEEP):
+        super().__init__(name='project-status-ticker', daemon=True)
+        self.max_sleep = max_sleep
+        self._stopped = False
+        self._wake_event = threading.Event()
+
+    def seconds_until_next(self):
+        next_at = get_cached_next_transition()
+        if next_at is None:
+            return self.max_sleep
+        delay = (next_at - timezone.now()).total_seconds()
+        return min(max(delay, 0), self.max_sleep)
+
+    def run(self):
+        from django.db import close_old_connections
+
+        while not self._stopped:
+            try:
+                run_due_transitions()
+                delay = self.seconds_until_next()
+            except DatabaseError:
+                # Tables may not exist yet (e.g. before the first migrate)
+                logger.exception('Project status ticker failed')
+                delay = self.max_sleep
+            finally:
+                close_old_connections()
+            # Sleep until the boundary, an invalidation wakes us, or max_sleep passes
+            self._wake_event.wait(max(delay, 1))
+            self._wake_event.clear()
+
+    def wake(self):
+        self._wake_event.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake_event.set()
+
+
+_ticker = None
+_ticker_lock = threading.Lock()
+
+
+def start_ticker():
+    """Start the process-wide ticker once"""
+    global _ticker
+    with _ticker_lock:
+        if _ticker is None or not _ticker.is_alive():
+            _ticker = TransitionTicker()
+            _ticker.start()
+    return _ticker
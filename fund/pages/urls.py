@@ -4,7 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.home_view, name='home'),
     path('register/', views.register_view, name='register'),
-    path('activate/<uuid:token>/', views.activate_account, name='activate'),
+    path('activate/<str:token>/', views.activate_account, name='activate'),
     path('login/', views.user_login_view, name='login'),
     path('logout/', views.user_logout_view, name='logout'),
     path('logout/all/', views.logout_all_view, name='logout_all'),
@@ -14,10 +14,11 @@ urlpatterns = [
     path('my-donations/', views.my_donations_view, name='my_donations'),
     path('project/create/', views.project_create_view, name='project_create'),
     path('projects/', views.project_list_view, name='project_list'),
+    path('tags/autocomplete/', views.tag_autocomplete_view, name='tag_autocomplete'),
     
     # Password management URLs - using UUID pattern to match TokenService
     path('password-reset/', views.password_reset_request, name='password_reset_request'),
-    path('password-reset-confirm/<uuid:token>/', views.password_reset_confirm, name='password_reset_confirm'),
+    path('password-reset-confirm/<str:token>/', views.password_reset_confirm, name='password_reset_confirm'),
     path('change-password/', views.change_password_view, name='change_password'),
     
     # Account management URLs
@@ -32,6 +33,7 @@ urlpatterns = [
     path('project/delete/<int:project_id>/', views.delete_project_view, name='delete_project'),
     path('profile/<int:user_id>/', views.public_profile_view, name='public_profile'),
     path('comment/<int:comment_id>/report/', views.report_comment_view, name='report_comment'),
+    path('comment/<int:comment_id>/replies/', views.comment_replies_view, name='comment_replies'),
 
     path('user/<int:user_id>/', views.public_profile_view, name='public_profile'),
     
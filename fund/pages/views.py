@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, authenticate, logout, update_session_auth_hash
+from django.contrib.auth import login, logout, update_session_auth_hash
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.forms import PasswordChangeForm
 from django.contrib import messages
@@ -7,10 +7,12 @@ from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from django.utils.timesince import timesince
 from django.db.models import Sum, Avg
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 from .models import Project, Tag
 from django.core.exceptions import ValidationError
@@ -20,7 +22,6 @@ from django.db.models import Sum, Count, Q
 from django.db.models.functions import Coalesce
 from decimal import Decimal
 # from .services import get_user_user, is_user_logged_in
-from pages.session_utils import update_project_statuses
   
 
 
@@ -28,6 +29,13 @@ from pages.session_utils import update_project_statuses
 from .models import CustomUser, ActivationToken, Project, Donation, PasswordResetToken, Comment, Rating, ProjectPicture, ReportedProject, ReportedComment
 from .forms import CustomUserCreationForm, UserProfileEditForm, ProjectCreationForm, AdminAuthenticationForm, UserAuthenticationForm
 from .tokens import TokenService
+from . import search as project_search
+from .autocomplete import complete_tags
+from .cache_versions import HOME_SECTIONS, HOME_SECTIONS_TIMEOUT, get_version
+from .facets import project_facets
+from .images import variant_sources
+from .pagination import CachedCountPaginator, CursorPaginator, InvalidCursor, cached_count
+from .throttle import is_throttled
 from .session_utils import set_admin_session, set_user_session, clear_admin_session, clear_user_session, get_admin_user, get_user_user, is_admin_logged_in, is_user_logged_in
 
 
@@ -41,12 +49,15 @@ def register_view(request):
     if request.method == 'POST':
         form = CustomUserCreationForm(request.POST, request.FILES)
         if form.is_valid():
-            user = form.save(commit=False)
-            user.is_active = False
-            user.save()
-            
-            # Send only activation link
-            TokenService.send_activation_email(user, request)
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.is_active = False
+                # Avatars are rendered by `manage.py process_images`
+                user.profile_picture_pending = bool(user.profile_picture)
+                user.save()
+                
+                # Queue only the activation link; send_outbox delivers it
+                TokenService.send_activation_email(user, request)
             
             messages.success(request, 'Registration successful! Check your email for the activation link.')
             return redirect('login')
@@ -66,9 +77,6 @@ def activate_account(request, token):
     user.is_active = True
     user.save()
     
-    # Delete the used token
-    ActivationToken.objects.filter(user=user).delete()
-    
     messages.success(request, 'Your account has been activated successfully! You can now login.')
     return redirect('login')
 
@@ -79,19 +87,17 @@ def admin_login_view(request):
         return redirect('admin_dashboard')
 
     if request.method == 'POST':
+        # Refuse bursts before the form hashes the password
+        if is_throttled(request, 'admin_login', request.POST.get('username')):
+            messages.error(request, 'Too many login attempts. Please wait a few minutes and try again.')
+            return render(request, 'auth/admin_login.html', {'form': AdminAuthenticationForm()}, status=429)
+
         form = AdminAuthenticationForm(request, data=request.POST)
 
         if form.is_valid():
-            email = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-
-            # Use only our custom AdminAuthenticationBackend
-            user = authenticate(
-                request,
-                username=email,
-                password=password,
-                backend='pages.authentication_backends.AdminAuthenticationBackend'
-            )
+            # The form already authenticated the credentials (one lookup,
+            # one password check); don't hash them a second time
+            user = form.get_user()
 
             if user is not None:
                 if user.is_active and (user.is_staff or user.is_superuser):
@@ -128,19 +134,17 @@ def user_login_view(request):
         messages.error(request, 'Facebook login was cancelled.')
     
     if request.method == 'POST':
+        # Refuse bursts before the form hashes the password
+        if is_throttled(request, 'login', request.POST.get('username')):
+            messages.error(request, 'Too many login attempts. Please wait a few minutes and try again.')
+            return render(request, 'auth/login.html', {'form': UserAuthenticationForm()}, status=429)
+
         form = UserAuthenticationForm(request, data=request.POST)
         
         if form.is_valid():
-            email = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            
-            # Authenticate using user backend
-            user = authenticate(
-                request, 
-                username=email, 
-                password=password,
-                backend='pages.authentication_backends.UserAuthenticationBackend'
-            )
+            # The form already authenticated the credentials (one lookup,
+            # one password check); don't hash them a second time
+            user = form.get_user()
             
             if user is not None:
                 if user.is_active and not user.is_staff and not user.is_superuser:
@@ -221,21 +225,15 @@ def project_create_view(request):
                 
                 # Handle new tags
                 new_tags = form.cleaned_data.get('new_tags', [])
-                for tag_name in new_tags:
-                    tag, created = Tag.objects.get_or_create(name=tag_name.lower())
-                    project.tags.add(tag)
+                if new_tags:
+                    project.tags.add(*Tag.get_or_create_many(new_tags))
                 
-                # Handle multiple images if provided
+                # Handle multiple images if provided. Like the main image, they
+                # are only written to disk here; `manage.py process_images`
+                # normalizes them later.
                 additional_images = request.FILES.getlist('additional_images')
                 if additional_images:
-                    for i, image in enumerate(additional_images):
-                        # Set first additional image as primary if no main image was uploaded
-                        is_primary = (i == 0 and not project.image)
-                        ProjectPicture.objects.create(
-                            project=project, 
-                            image=image, 
-                            is_primary=is_primary
-                        )
+                    ProjectPicture.add_to_new_project(project, additional_images)
                 
                 messages.success(request, 'Project created successfully!')
                 return redirect('my_projects')
@@ -259,62 +257,77 @@ def project_create_view(request):
     
     return render(request, 'auth/project_create.html', {'form': form})
 
+# Keyset ordering per sort option; the trailing id makes every position unique
+PROJECT_SORT_ORDERING = {
+    'relevance': ['search_rank', 'id'],
+    'newest': ['-created_at', '-id'],
+    'oldest': ['created_at', 'id'],
+    'highest_funded': ['-total_raised', '-id'],
+    'most_popular': ['-donor_count', '-id'],
+    'ending_soon': ['end_date', 'id'],
+}
+
+
 def project_list_view(request):
     """View to show all projects with filtering and sorting options"""
-    # Update all project statuses first
-    update_project_statuses()
-    
-    # Then proceed with the rest of the view logic
-    projects = Project.objects.all()
+    # Status transitions run out of band (see pages/transitions.py)
+    projects = Project.objects.with_card_stats().with_effective_status()
     
     # Get filter parameters from request
     category = request.GET.get('category')
     status = request.GET.get('status')
-    sort = request.GET.get('sort', 'newest')
     search = request.GET.get('search')
+    # Searches are ordered by relevance unless another sort is picked
+    sort = request.GET.get('sort') or ('relevance' if search else 'newest')
+    if sort == 'relevance' and not search:
+        sort = 'newest'
     tag_search = request.GET.get('tag')
+    fuzzy = request.GET.get('fuzzy') == '1'
     
-    # Apply filters
-    if category:
-        projects = projects.filter(category=category)
-    if status:
-        projects = projects.filter(status=status)
-    
-    # Apply search by name, description, OR tags
-    if search:
-        projects = projects.filter(
-            Q(title__icontains=search) |
-            Q(tags__name__icontains=search)
-        ).distinct()
-    
-    # Apply tag-specific search (if provided)
-    if tag_search:
-        projects = projects.filter(tags__name__icontains=tag_search).distinct()
+    # Apply filters, search and tag search
+    filters = {
+        'category': category, 'status': status, 'search': search,
+        'fuzzy': fuzzy, 'tag': tag_search,
+    }
+    # The fuzzy match is scored once and shared by the listing and the facet
+    # counts; lazily, so that cached facets alone don't pay for it
+    fuzzy_ids = None
+    if search and fuzzy:
+        fuzzy_ids = SimpleLazyObject(lambda: project_search.fuzzy_ranked_ids(search))
+    projects = project_search.filter_projects(projects, filters, fuzzy_ids=fuzzy_ids)
     
     # Apply sorting
-    if sort == 'newest':
-        projects = projects.order_by('-created_at')
-    elif sort == 'oldest':
-        projects = projects.order_by('created_at')
-    elif sort == 'highest_funded':
-        projects = projects.annotate(
-            total_donations=Coalesce(Sum('donations__amount'), Decimal('0.00'))
-        ).order_by('-total_donations')
-    elif sort == 'most_popular':
-        projects = projects.annotate(
-            donation_count=Count('donations')
-        ).order_by('-donation_count')
-    elif sort == 'ending_soon':
+    if sort == 'ending_soon':
         # Only show active projects for ending soon
-        projects = projects.filter(status='active').order_by('end_date')
+        projects = projects.filter(effective_status='active')
+    ordering = PROJECT_SORT_ORDERING.get(sort, PROJECT_SORT_ORDERING['newest'])
     
-    # Get all unique tags for the tag cloud
-    all_tags = Tag.objects.annotate(project_count=Count('project')).order_by('-project_count')[:20]
+    # Counts next to each filter option and the tag cloud, scoped to the current filters
+    category_facets, status_facets, tag_facets = project_facets(filters, fuzzy_ids)
     
-    # Pagination
-    paginator = Paginator(projects, 12)
+    # The filters that define the result set, for the cached total
+    count_key = dict(filters, ending_soon=sort == 'ending_soon')
+    
+    # Pagination: keyset cursors (after/before), so deep pages cost the same
+    # as the first one; numbered ?page= links from old bookmarks still work
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    cursor_pagination = not page_number
+    if cursor_pagination:
+        paginator = CursorPaginator(projects, ordering, 12)
+        try:
+            page_obj = paginator.page(after=request.GET.get('after'), before=request.GET.get('before'))
+        except InvalidCursor:
+            page_obj = paginator.page()
+        total_projects = cached_count(projects, count_key)
+    else:
+        paginator = CachedCountPaginator(projects.order_by(*ordering), 12, count_key)
+        page_obj = paginator.get_page(page_number)
+        total_projects = paginator.count
+    
+    # Current filters, for building the previous/next links
+    filter_query = request.GET.copy()
+    for param in ('page', 'after', 'before'):
+        filter_query.pop(param, None)
     
     context = {
         'page_obj': page_obj,
@@ -325,8 +338,13 @@ def project_list_view(request):
         'current_sort': sort,
         'search_query': search,
         'tag_query': tag_search,
-        'all_tags': all_tags,
-        'total_projects': projects.count(),
+        'fuzzy': fuzzy,
+        'category_facets': category_facets,
+        'status_facets': status_facets,
+        'tag_facets': tag_facets,
+        'total_projects': total_projects,
+        'cursor_pagination': cursor_pagination,
+        'filter_query': filter_query.urlencode(),
     }
     return render(request, 'auth/project_list.html', context)
 
@@ -338,7 +356,7 @@ def profile_view(request):
         messages.error(request, 'Please log in as a regular user to access your profile.')
         return redirect('login')
     
-    user_projects = Project.objects.filter(creator=user_user).order_by('-created_at')
+    user_projects = Project.objects.with_card_stats().filter(creator=user_user).order_by('-created_at')
     user_donations = Donation.objects.filter(user=user_user).select_related('project').order_by('-donated_at')
     
     context = {
@@ -364,6 +382,9 @@ def edit_profile_view(request):
             user = form.save(commit=False)
             # Ensure email remains unchanged (extra security)
             user.email = user_user.email
+            if 'profile_picture' in form.changed_data:
+                # Avatars are rendered by `manage.py process_images`
+                user.profile_picture_pending = bool(user.profile_picture)
             user.save()
             messages.success(request, 'Your profile has been updated successfully!')
             return redirect('profile')
@@ -408,7 +429,7 @@ def my_projects_view(request):
         messages.error(request, 'Please log in as a regular user to view your projects.')
         return redirect('login')
     
-    user_projects = Project.objects.filter(creator=user_user).order_by('-created_at')
+    user_projects = Project.objects.with_card_stats().filter(creator=user_user).order_by('-created_at')
     return render(request, 'auth/my_projects.html', {'projects': user_projects})
 
 def my_donations_view(request):
@@ -423,18 +444,16 @@ def my_donations_view(request):
 
 def home_view(request):
     # Top 5 rated **active** projects
-    top_rated_projects = Project.objects.filter(
-        status='active',
-        end_date__gte=timezone.now()  # optional: only ongoing
-    ).annotate(
-        avg_rating=Avg('ratings__value')
+    # (with_card_stats annotates avg_rating)
+    top_rated_projects = Project.objects.with_card_stats().with_effective_status().filter(
+        effective_status='active'
     ).order_by('-avg_rating')[:5]
     
     # Latest 5 projects (all statuses)
-    latest_projects = Project.objects.order_by('-created_at')[:5]
+    latest_projects = Project.objects.with_card_stats().order_by('-created_at')[:5]
     
     # Latest 5 featured projects (all statuses)
-    featured_projects = Project.objects.filter(
+    featured_projects = Project.objects.with_card_stats().filter(
         is_featured=True
     ).order_by('-created_at')[:5]
     
@@ -446,12 +465,28 @@ def home_view(request):
         'latest_projects': latest_projects,
         'featured_projects': featured_projects,
         'categories': categories,
+        # The sections are cached as rendered fragments; when they hit, the
+        # querysets above are never evaluated
+        'home_cache_version': get_version(HOME_SECTIONS),
+        'home_cache_timeout': HOME_SECTIONS_TIMEOUT,
     }
     
     return render(request, 'pages/home.html', context)
 
+def tag_autocomplete_view(request):
+    """JSON tag suggestions for a typed prefix, most used tags first"""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 10)), 10))
+    except ValueError:
+        limit = 10
+    results = [
+        {'id': tag_id, 'name': name, 'project_count': project_count}
+        for tag_id, name, project_count in complete_tags(request.GET.get('q', ''), limit)
+    ]
+    return JsonResponse({'results': results})
+
 def category_projects(request, category_key):
-    projects = Project.objects.filter(category=category_key, status="active").order_by("-created_at")
+    projects = Project.objects.with_card_stats().with_effective_status().filter(category=category_key, effective_status="active").order_by("-created_at")
 
     category_name = dict(Project.CATEGORY_CHOICES).get(category_key, category_key)
 
@@ -466,6 +501,9 @@ def category_projects(request, category_key):
 def password_reset_request(request):
     if request.method == 'POST':
         email = request.POST.get('email')
+        if is_throttled(request, 'password_reset', email):
+            messages.error(request, 'Too many password reset requests. Please wait a few minutes and try again.')
+            return render(request, 'auth/password_reset_request.html', status=429)
         try:
             user = CustomUser.objects.get(email=email)
             TokenService.send_password_reset_email(user, request)
@@ -476,7 +514,7 @@ def password_reset_request(request):
     
     return render(request, 'auth/password_reset_request.html')
 
-def password_reset_confirm(request, token):  # token will be a UUID object
+def password_reset_confirm(request, token):  # a UUID, or a signed string with SIGNED_ACCOUNT_TOKENS
     user, error_message = TokenService.validate_password_reset_token(token)
     
     if error_message:
@@ -491,8 +529,8 @@ def password_reset_confirm(request, token):  # token will be a UUID object
             user.set_password(password)
             user.save()
             
-            # Delete the used token
-            PasswordResetToken.objects.filter(user=user).delete()
+            # Invalidate the used token
+            TokenService.consume_password_reset_token(user)
             
             messages.success(request, 'Your password has been reset successfully. You can now login.')
             return redirect('login')
@@ -524,12 +562,34 @@ def change_password_view(request):
     return render(request, 'auth/change_password.html', {'form': form})
 
 
+# Top-level comments are shown a page at a time, newest first; replies are
+# loaded on demand from comment_replies_view
+COMMENT_ORDERING = ['-created_at', '-id']
+COMMENTS_PER_PAGE = 10
+REPLIES_PER_PAGE = 20
+
+
+def comment_report_info(user_user, comment_ids):
+    """
+    (ids the user reported, {id: report count}) for a set of comments, in two
+    queries however many comments there are
+    """
+    reported_ids = set()
+    if user_user:
+        reported_ids = set(ReportedComment.objects.filter(
+            user=user_user,
+            comment_id__in=comment_ids
+        ).values_list('comment_id', flat=True))
+    report_counts = dict(
+        ReportedComment.objects.filter(comment_id__in=comment_ids).order_by()
+        .values_list('comment_id').annotate(count=Count('id'))
+    )
+    return reported_ids, report_counts
+
+
 # Fixed Project Detail View
 def project_detail_view(request, project_id):
     """View for individual project details with reply functionality"""
-    # Update project statuses first
-    update_project_statuses()
-    
     project = get_object_or_404(Project, id=project_id)
     
     user_user = get_user_user(request)
@@ -548,23 +608,32 @@ def project_detail_view(request, project_id):
     
     # Get all donations and comments
     all_donations = Donation.objects.filter(project=project).select_related('user').order_by('-donated_at')
-    all_comments = Comment.objects.filter(project=project, parent__isnull=True).select_related('user').prefetch_related('replies__user').order_by('-created_at')
+    all_comments = Comment.objects.filter(project=project, parent__isnull=True).select_related('user')
     ratings = Rating.objects.filter(project=project)
     
     # Check if user wants to show all items
     show_all_donations = request.GET.get('show_donations') == 'all'
-    show_all_comments = request.GET.get('show_comments') == 'all'
     
     # Get limited or all items based on user selection
     donations = all_donations[:5] if not show_all_donations else all_donations
-    comments = all_comments[:5] if not show_all_comments else all_comments
+    
+    # One page of top-level comments (keyset cursors, so the page size bounds
+    # the work however long the discussion gets)
+    comment_paginator = CursorPaginator(all_comments, COMMENT_ORDERING, COMMENTS_PER_PAGE)
+    try:
+        comments = comment_paginator.page(
+            after=request.GET.get('comments_after'),
+            before=request.GET.get('comments_before'),
+        )
+    except InvalidCursor:
+        comments = comment_paginator.page()
     
     # Calculate average rating
     average_rating = ratings.aggregate(avg=Avg('value'))['avg'] or 0
     
     # Get similar projects
-    similar_projects = Project.objects.filter(
-        status='active',
+    similar_projects = Project.objects.with_card_stats().with_effective_status().filter(
+        effective_status='active',
         tags__in=project.tags.all()
     ).exclude(id=project.id).distinct()[:4]
     
@@ -578,37 +647,16 @@ def project_detail_view(request, project_id):
     if user_user and hasattr(user_user, 'id') and user_user.id == project.creator.id:
         can_delete = project.can_cancel()
     
-    # Add reporting information to each comment and its replies
-    comments_with_reports = []
-    for comment in comments:
-        # Check if current user has reported this comment
-        user_reported_comment = False
-        if user_user:
-            user_reported_comment = ReportedComment.objects.filter(
-                user=user_user, 
-                comment=comment
-            ).exists()
-        
-        # Process replies for this comment
-        replies_with_reports = []
-        for reply in comment.replies.all():
-            user_reported_reply = False
-            if user_user:
-                user_reported_reply = ReportedComment.objects.filter(
-                    user=user_user, 
-                    comment=reply
-                ).exists()
-            
-            # Add the reported status to the reply object
-            reply.user_reported = user_reported_reply
-            replies_with_reports.append(reply)
-        
-        comments_with_reports.append({
+    # Add reporting information to each comment on the page
+    reported_ids, report_counts = comment_report_info(user_user, [comment.id for comment in comments])
+    comments_with_reports = [
+        {
             'comment': comment,
-            'user_reported': user_reported_comment,
-            'report_count': ReportedComment.objects.filter(comment=comment).count(),
-            'replies': replies_with_reports
-        })
+            'user_reported': comment.id in reported_ids,
+            'report_count': report_counts.get(comment.id, 0),
+        }
+        for comment in comments
+    ]
     
     # Handle form submissions
     if request.method == 'POST' and user_user:
@@ -622,15 +670,18 @@ def project_detail_view(request, project_id):
             if content:
                 if parent_id:  # This is a reply
                     try:
-                        parent_comment = Comment.objects.get(id=parent_id)
-                        Comment.objects.create(
-                            user=user_user,
-                            project=project,
-                            content=content,
-                            parent=parent_comment
-                        )
-                        messages.success(request, 'Your reply has been added!')
-                    except Comment.DoesNotExist:
+                        parent_comment = Comment.objects.get(id=parent_id, project=project)
+                        if not parent_comment.accepts_replies():
+                            messages.error(request, 'This conversation is too deep to reply to.')
+                        else:
+                            Comment.objects.create(
+                                user=user_user,
+                                project=project,
+                                content=content,
+                                parent=parent_comment
+                            )
+                            messages.success(request, 'Your reply has been added!')
+                    except (Comment.DoesNotExist, ValueError):
                         messages.error(request, 'Invalid comment to reply to.')
                 else:  # This is a top-level comment
                     Comment.objects.create(
@@ -640,8 +691,8 @@ def project_detail_view(request, project_id):
                     )
                     messages.success(request, 'Your comment has been added!')
                 
-                # Redirect to show all comments after adding a new one
-                return redirect(f'{reverse("project_detail", args=[project.id])}?show_comments=all')
+                # Back to the first page of comments, where a new one shows up
+                return redirect(f'{reverse("project_detail", args=[project.id])}#comments')
         
         # Rating submission
         elif form_type == 'rating':
@@ -691,8 +742,8 @@ def project_detail_view(request, project_id):
         'all_donations_count': all_donations.count(),
         'show_all_donations': show_all_donations,
         'comments_with_reports': comments_with_reports,
+        'comments_page': comments,
         'all_comments_count': all_comments.count(),
-        'show_all_comments': show_all_comments,
         'average_rating': round(average_rating, 1),
         'similar_projects': similar_projects,
         'user_rating': user_rating,
@@ -707,33 +758,6 @@ def project_detail_view(request, project_id):
     return render(request, 'auth/project_detail.html', context)
 # Updated functions with proper timezone handling
 
-def update_project_statuses():
-    """Update project statuses based on current date and time"""
-    from django.utils import timezone
-    now = timezone.now()
-    
-    print(f"Current time (timezone aware): {now}")  # Debug line
-    
-    # Update projects from 'coming_soon' to 'active' when start_date is reached
-    coming_soon_projects = Project.objects.filter(status='coming_soon')
-    for project in coming_soon_projects:
-        print(f"Project: {project.title}, Start: {project.start_date}, Now: {now}, Start <= Now: {project.start_date <= now}")  # Debug
-        
-    updated_to_active = Project.objects.filter(
-        status='coming_soon',
-        start_date__lte=now
-    ).update(status='active')
-    
-    print(f"Updated {updated_to_active} projects to active")  # Debug
-    
-    # Update projects from 'active' to 'completed' when end_date is reached
-    updated_to_completed = Project.objects.filter(
-        status='active',
-        end_date__lte=now
-    ).update(status='completed')
-    
-    print(f"Updated {updated_to_completed} projects to completed")  # Debug
-
 def project_create_view(request):
     # Only allow regular users to create projects
     user_user = get_user_user(request)
@@ -781,21 +805,15 @@ def project_create_view(request):
                 
                 # Handle new tags
                 new_tags = form.cleaned_data.get('new_tags', [])
-                for tag_name in new_tags:
-                    tag, created = Tag.objects.get_or_create(name=tag_name.lower())
-                    project.tags.add(tag)
+                if new_tags:
+                    project.tags.add(*Tag.get_or_create_many(new_tags))
                 
-                # Handle multiple images if provided
+                # Handle multiple images if provided. Like the main image, they
+                # are only written to disk here; `manage.py process_images`
+                # normalizes them later.
                 additional_images = request.FILES.getlist('additional_images')
                 if additional_images:
-                    for i, image in enumerate(additional_images):
-                        # Set first additional image as primary if no main image was uploaded
-                        is_primary = (i == 0 and not project.image)
-                        ProjectPicture.objects.create(
-                            project=project, 
-                            image=image, 
-                            is_primary=is_primary
-                        )
+                    ProjectPicture.add_to_new_project(project, additional_images)
                 
                 messages.success(request, 'Project created successfully!')
                 return redirect('my_projects')
@@ -856,6 +874,56 @@ def report_comment_view(request, comment_id):
     return redirect('project_detail', project_id=comment.project.id)
 
 
+def comment_replies_view(request, comment_id):
+    """JSON page of the replies below a comment (at any depth), in thread order"""
+    comment = get_object_or_404(Comment.objects.select_related('project'), id=comment_id)
+    user_user = get_user_user(request)
+    
+    # Same restriction as the project page
+    project = comment.project
+    if (project.status == 'canceled' and
+        not (user_user and user_user.id == project.creator_id) and
+        not is_admin_logged_in(request)):
+        return JsonResponse({'error': 'Project not available'}, status=404)
+    
+    # The subthread is one range of the path index; the cursor continues it
+    paginator = CursorPaginator(comment.subthread().select_related('user'), ['path'], REPLIES_PER_PAGE)
+    try:
+        replies = paginator.page(after=request.GET.get('after'))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Invalid cursor'}, status=400)
+    
+    reported_ids, report_counts = comment_report_info(user_user, [reply.id for reply in replies])
+    results = []
+    for reply in replies:
+        user_reported = reply.id in reported_ids
+        # Only renditions rendered at upload are listed, never rendered here
+        picture_url, picture_srcset = (
+            variant_sources(reply.user.profile_picture, 'avatar') if reply.user.profile_picture else (None, '')
+        )
+        results.append({
+            'id': reply.id,
+            'parent_id': reply.parent_id,
+            'depth': reply.depth - comment.depth,
+            'content': reply.content,
+            'created_at': reply.created_at.isoformat(),
+            'timesince': timesince(reply.created_at),
+            'reply_count': reply.reply_count,
+            'report_count': report_counts.get(reply.id, 0),
+            'user': {
+                'id': reply.user_id,
+                'name': reply.user.get_full_name(),
+                'profile_url': reverse('public_profile', args=[reply.user_id]),
+                'picture_url': picture_url,
+                'picture_srcset': picture_srcset,
+            },
+            'user_reported': user_reported,
+            'can_report': bool(user_user) and user_user.id != reply.user_id and not user_reported,
+            'report_url': reverse('report_comment', args=[reply.id]),
+        })
+    return JsonResponse({'results': results, 'next': replies.next_cursor})
+
+
 def donate_view(request, project_id):
     """Simple donation view - you can expand this later"""
     project = get_object_or_404(Project, id=project_id)
@@ -914,9 +982,9 @@ def public_profile_view(request, user_id):
     profile_user = get_object_or_404(CustomUser, id=user_id)
     
     # Only show basic information and projects
-    user_projects = Project.objects.filter(
+    user_projects = Project.objects.with_card_stats().with_effective_status().filter(
         creator=profile_user, 
-        status__in=['active', 'coming_soon','completed']  # Include both statuses
+        effective_status__in=['active', 'coming_soon','completed']  # Include both statuses
     ).order_by('-created_at')
     
     